@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import textwrap
+import time
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+
+from PIL import Image
+from rich.console import Console
+from rich.table import Table
+
+from parse import pdf_to_images, slices_to_images
+from parse.pylib import text_util
+from parse.pylib.slice_box import Box
+from parse.pylib.slice_page import Page
+
+WORDS = [
+    *("specimen", "holotype", "paratype", "female", "male", "antenna", "setae"),
+    *("pronotum", "elytra", "(fig. 3)", "length", "width", "ca.", "mm", "µm"),
+    *("Ã©", "dorsal", "ventral"),
+]
+
+RNG = random.Random()  # noqa: S311
+
+
+def main(args: argparse.Namespace) -> None:
+    RNG.seed(args.seed)
+    console = Console()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = Path(temp_dir)
+        benches = {
+            "clean_text": bench_clean_text,
+            "compress": bench_compress,
+            "remove_figures": bench_remove_figures,
+            "page_find": bench_page_find,
+            "page_filter_size": bench_page_filter_size,
+            "page_resized": bench_page_resized,
+            "slices_to_images": bench_slices_to_images,
+            "pdf_to_images": bench_pdf_to_images,
+        }
+
+        results = {}
+        for name, bench in benches.items():
+            if args.only and name not in args.only:
+                continue
+            console.log(f"[blue]{name}")
+            results[name] = bench(work_dir, args)
+
+    output = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "scale": args.scale,
+        "repeats": args.repeats,
+        "results": results,
+    }
+
+    if args.out_json:
+        with args.out_json.open("w") as f:
+            json.dump(output, f, indent=4)
+
+    baseline = None
+    if args.compare:
+        with args.compare.open() as f:
+            baseline = json.load(f)
+
+    console.print(report(output, baseline))
+
+
+def timed(
+    func: Callable[[], object], repeats: int, items: int, unit: str
+) -> dict[str, float | int | str]:
+    """Time a function and report the median, best, and items per second."""
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    median = statistics.median(times)
+    return {
+        "median": median,
+        "min": min(times),
+        "items": items,
+        "unit": unit,
+        "rate": items / median if median else 0.0,
+    }
+
+
+def skipped(reason: str) -> dict[str, str]:
+    return {"skipped": reason}
+
+
+def fake_text(lines: int) -> str:
+    return "\n".join(
+        "  ".join(RNG.choices(WORDS, k=12)) + RNG.choice(["-", "", " "])
+        for _ in range(lines)
+    )
+
+
+def fake_boxes(count: int, width: int = 1000, height: int = 1400) -> list[Box]:
+    boxes = []
+    for _ in range(count):
+        x, y = RNG.randrange(width), RNG.randrange(height)
+        w, h = RNG.randint(1, 300), RNG.randint(1, 300)
+        boxes.append(Box(x0=x, y0=y, x1=x + w, y1=y + h))
+    return boxes
+
+
+def fake_scan(path: Path, width: int = 5100, height: int = 6600) -> Path:
+    """Make a 600 dpi letter size page of noise, the worst case for a codec."""
+    Image.effect_noise((width, height), 64).convert("RGB").save(path, quality=90)
+    return path
+
+
+def bench_clean_text(_: Path, args: argparse.Namespace) -> dict:
+    text = fake_text(2_000 * args.scale)
+    replace = {"Ã©": "é", "â€™": "'", "â€œ": '"', "â€\x9d": '"'}
+    return timed(
+        lambda: text_util.clean_text(text, replace=replace, eol_hyphens=True),
+        args.repeats,
+        len(text),
+        "chars",
+    )
+
+
+def bench_compress(_: Path, args: argparse.Namespace) -> dict:
+    text = fake_text(20_000 * args.scale)
+    return timed(lambda: text_util.compress(text), args.repeats, len(text), "chars")
+
+
+def bench_remove_figures(_: Path, args: argparse.Namespace) -> dict:
+    text = fake_text(20_000 * args.scale)
+    return timed(
+        lambda: text_util.remove_figures(text), args.repeats, len(text), "chars"
+    )
+
+
+def bench_page_find(_: Path, args: argparse.Namespace) -> dict:
+    page = Page(Path("page.jpg"), 1000)
+    page.boxes = fake_boxes(2_000 * args.scale)
+    points = [(RNG.randrange(1000), RNG.randrange(1400)) for _ in range(100)]
+
+    def find() -> None:
+        for x, y in points:
+            page.find(x, y, "largest")
+
+    return timed(find, args.repeats, len(points), "lookups")
+
+
+def bench_page_filter_size(_: Path, args: argparse.Namespace) -> dict:
+    boxes = fake_boxes(20_000 * args.scale)
+    page = Page(Path("page.jpg"), 1000)
+
+    def filter_size() -> None:
+        page.boxes = boxes
+        page.filter_size()
+
+    return timed(filter_size, args.repeats, len(boxes), "boxes")
+
+
+def bench_page_resized(work_dir: Path, args: argparse.Namespace) -> dict:
+    page = Page(fake_scan(work_dir / "scan.jpg"), 1000)
+    return timed(lambda: page.resized(1000), args.repeats, 1, "pages")
+
+
+def bench_slices_to_images(work_dir: Path, args: argparse.Namespace) -> dict:
+    page_dir = work_dir / "pages"
+    page_dir.mkdir()
+    scan = fake_scan(work_dir / "slice_scan.jpg", 2550, 3300)
+
+    slices = []
+    for i in range(1, 2 * args.scale + 1):
+        path = scan.with_stem(f"doc-{i:02d}")
+        shutil.copy(scan, path)
+        boxes = [
+            {"x0": 100, "y0": y, "x1": 2400, "y1": y + 300, "start": not b}
+            for b, y in enumerate(range(100, 3000, 400))
+        ]
+        slices.append({"path": str(path), "boxes": boxes})
+    count = sum(len(p["boxes"]) for p in slices)
+
+    def crop() -> None:
+        out_dir = Path(tempfile.mkdtemp(dir=work_dir))
+        plan = slices_to_images.plan_slices(slices, out_dir, "desc")
+        for page_path, crops in plan:
+            slices_to_images.crop_page(page_path, crops)
+
+    return timed(crop, args.repeats, count, "slices")
+
+
+def bench_pdf_to_images(work_dir: Path, args: argparse.Namespace) -> dict:
+    if not shutil.which("pdftocairo") or not shutil.which("pdfinfo"):
+        return skipped("poppler-utils is not installed")
+
+    pages = [
+        Image.effect_noise((1275, 1650), 64).convert("RGB")
+        for _ in range(4 * args.scale)
+    ]
+    pdf = work_dir / "doc.pdf"
+    pages[0].save(pdf, save_all=True, append_images=pages[1:], resolution=150)
+
+    def render() -> None:
+        out_dir = Path(tempfile.mkdtemp(dir=work_dir))
+        pdf_to_images.pdf_to_images(pdf, out_dir, args.jobs)
+
+    return timed(render, args.repeats, len(pages), "pages")
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def report(output: dict, baseline: dict | None = None) -> Table:
+    table = Table(title=f"Benchmarks at {output['commit']}")
+    table.add_column("Benchmark")
+    table.add_column("Median (s)", justify="right")
+    table.add_column("Rate", justify="right")
+    if baseline:
+        table.add_column(f"vs {baseline['commit']}", justify="right")
+
+    for name, result in output["results"].items():
+        if "skipped" in result:
+            table.add_row(name, "skipped", result["skipped"])
+            continue
+
+        row = [
+            name,
+            f"{result['median']:.4f}",
+            f"{result['rate']:,.1f} {result['unit']}/s",
+        ]
+
+        if baseline:
+            old = baseline["results"].get(name, {})
+            if old.get("median"):
+                change = result["median"] / old["median"] - 1.0
+                color = "green" if change <= 0 else "red"
+                row.append(f"[{color}]{change:+.1%}[/{color}]")
+            else:
+                row.append("")
+
+        table.add_row(*row)
+
+    return table
+
+
+def parse_args() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        allow_abbrev=True,
+        description=textwrap.dedent(
+            """
+            Benchmark the hot paths of the parse scripts on synthetic data made
+            on the fly. Save the results as JSON and compare them with the results
+            from another commit.
+            """
+        ),
+    )
+
+    arg_parser.add_argument(
+        "--out-json",
+        type=Path,
+        metavar="PATH",
+        help="""Save the results to this JSON file.""",
+    )
+
+    arg_parser.add_argument(
+        "--compare",
+        type=Path,
+        metavar="PATH",
+        help="""Compare the results with those in this JSON file.""",
+    )
+
+    arg_parser.add_argument(
+        "--only",
+        nargs="*",
+        metavar="NAME",
+        help="""Only run these benchmarks.""",
+    )
+
+    arg_parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        metavar="INT",
+        help="""Run each benchmark this many times. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--scale",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""Multiply the size of the synthetic data by this.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""Processes to use for pdf_to_images. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--seed",
+        type=int,
+        default=1234,
+        metavar="INT",
+        help="""Random seed for the synthetic data. (default: %(default)s)""",
+    )
+
+    args = arg_parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    main(ARGS)
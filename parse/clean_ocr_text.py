@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import textwrap
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TextIO
+
+from parse.pylib import log, metrics, text_util
+
+
+def main(args: argparse.Namespace) -> None:
+    log.started(args.metrics)
+
+    trans = None
+    if args.trans_json:
+        with args.trans_json.open() as f:
+            trans = str.maketrans(json.load(f))
+
+    replace = None
+    if args.replace_json:
+        with args.replace_json.open() as f:
+            replace = json.load(f)
+
+    with (
+        metrics.span("clean", file=args.in_text.name),
+        args.in_text.open() as in_file,
+        args.out_text.open("w") as out_file,
+    ):
+        docs = documents(in_file, args.max_lines)
+        cleaned = text_util.clean_texts(
+            docs,
+            trans,
+            replace,
+            eol_hyphens=args.eol_hyphens,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+        )
+        for doc in cleaned:
+            out_file.write(doc)
+            out_file.write("\n\n")
+            metrics.count("documents")
+            metrics.count("chars_out", len(doc))
+
+    log.finished()
+
+
+def documents(in_file: TextIO, max_lines: int) -> Iterator[str]:
+    """
+    Split the input into documents at blank lines.
+
+    Input without blank lines is split every max_lines lines so that no document
+    gets too big. Hyphenated words are not joined across those forced splits.
+    """
+    lines = []
+    for ln in in_file:
+        metrics.count("chars_in", len(ln))
+        if ln.strip():
+            lines.append(ln)
+        if lines and (not ln.strip() or len(lines) >= max_lines):
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        allow_abbrev=True,
+        description=textwrap.dedent(
+            """
+            Clean a large OCR text file in one pass. The text is split into
+            documents at blank lines and the documents are cleaned in parallel.
+            The cleaned documents are written in order, separated by blank lines.
+            """
+        ),
+    )
+
+    arg_parser.add_argument(
+        "--in-text",
+        type=Path,
+        required=True,
+        metavar="PATH",
+        help="""The OCR text to clean.""",
+    )
+
+    arg_parser.add_argument(
+        "--out-text",
+        type=Path,
+        required=True,
+        metavar="PATH",
+        help="""Write the cleaned text to this file.""",
+    )
+
+    arg_parser.add_argument(
+        "--trans-json",
+        type=Path,
+        metavar="PATH",
+        help="""A JSON object mapping single characters to their replacements.""",
+    )
+
+    arg_parser.add_argument(
+        "--replace-json",
+        type=Path,
+        metavar="PATH",
+        help="""A JSON object mapping strings to their replacements.""",
+    )
+
+    arg_parser.add_argument(
+        "--eol-hyphens",
+        action="store_true",
+        help="""Join words hyphenated at the end of a line.""",
+    )
+
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        metavar="INT",
+        help="""How many processes to use. (default: the number of CPUs)""",
+    )
+
+    arg_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=64,
+        metavar="INT",
+        help="""Send this many documents to a process at a time.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--max-lines",
+        type=int,
+        default=10_000,
+        metavar="INT",
+        help="""Split documents longer than this many lines.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
+    args = arg_parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    main(ARGS)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import shutil
+import textwrap
+from pathlib import Path
+
+import rich
+
+from parse.pylib import log, metrics
+from parse.pylib.pdf_index import INDEX, PdfIndex
+
+
+def main(args: argparse.Namespace) -> None:
+    log.started(args.metrics)
+
+    pdf_dir = args.pdf_dir.absolute()
+    move_to = args.move_to.absolute() if args.move_to else None
+
+    pdfs = [
+        p
+        for p in sorted(pdf_dir.rglob(args.glob))
+        if p.is_file() and not p.is_symlink() and not in_dir(p, move_to)
+    ]
+
+    index = PdfIndex(args.index or pdf_dir / INDEX)
+    hashed = index.update(pdfs, args.jobs)
+    rich.print(f"{len(pdfs)} PDFs, {hashed} hashed")
+
+    for keep, *copies in index.duplicates():
+        rich.print(f"[bold green]{keep}[/bold green]")
+        for copy in copies:
+            rich.print(f"    {copy}")
+            if args.link:
+                link(copy, keep)
+            elif move_to:
+                move(copy, pdf_dir, move_to)
+            metrics.count("duplicates")
+
+    if args.link or move_to:
+        index.update(p for p in pdfs if p.is_file() and not p.is_symlink())
+    index.save()
+
+    log.finished()
+
+
+def link(copy: Path, keep: Path) -> None:
+    """Replace a copy with a symbolic link to the PDF that is kept."""
+    temp = copy.with_name(f".{copy.name}.link")
+    temp.symlink_to(os.path.relpath(keep, copy.parent))
+    temp.replace(copy)
+
+
+def move(copy: Path, pdf_dir: Path, move_to: Path) -> None:
+    """Move a copy out of the PDF directory, keeping its relative path."""
+    dst = move_to / copy.relative_to(pdf_dir)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(copy, dst)
+
+
+def in_dir(path: Path, dir_: Path | None) -> bool:
+    return dir_ is not None and path.is_relative_to(dir_)
+
+
+def parse_args() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        allow_abbrev=True,
+        description=textwrap.dedent(
+            """
+            Find PDFs with the same contents, even under different names, so that
+            each document is rendered and OCRed only once. The PDF directory is
+            searched recursively, and the hash of every PDF is kept in an index so
+            that later runs only read new and changed files. By default the
+            duplicates are only listed. The first PDF in each list is the one kept.
+            """
+        ),
+    )
+
+    arg_parser.add_argument(
+        "--pdf-dir",
+        type=Path,
+        required=True,
+        metavar="DIR",
+        help="""Search this directory, and the directories under it, for PDFs.""",
+    )
+
+    arg_parser.add_argument(
+        "--glob",
+        default="*.pdf",
+        help="""Which files to check. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--index",
+        type=Path,
+        metavar="PATH",
+        help=f"""Keep the index in this JSON file. (default: {INDEX} in the PDF
+            directory)""",
+    )
+
+    arg_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="INT",
+        help="""How many PDFs to hash at once. (default: %(default)s)""",
+    )
+
+    action = arg_parser.add_mutually_exclusive_group()
+
+    action.add_argument(
+        "--link",
+        action="store_true",
+        help="""Replace the duplicates with symbolic links to the PDF kept.
+            pdf_to_images.py skips links to a PDF it is already converting.""",
+    )
+
+    action.add_argument(
+        "--move-to",
+        type=Path,
+        metavar="DIR",
+        help="""Move the duplicates to this directory.""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
+    args = arg_parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    main(ARGS)
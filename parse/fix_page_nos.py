@@ -1,29 +1,45 @@
 #!/usr/bin/env python3
 import argparse
-import shutil
+import sys
 import textwrap
 from pathlib import Path
 
 import rich
-from pylib import log
+
+from parse.pylib import bulk_rename, log
 
 
 def main(args: argparse.Namespace) -> None:
-    log.started()
+    log.started(args.metrics)
+
+    undo_log = args.image_dir / bulk_rename.UNDO_LOG
 
-    paths = sorted(args.image_dir.glob(args.glob))
-    for src in paths:
-        parts = src.stem.split("_")
-        if len(parts) != 2:  # noqa: PLR2004
-            continue
+    if args.undo:
+        if not undo_log.exists():
+            rich.print(f"[bold red]Nothing to undo:[/bold red] no {undo_log}")
+            sys.exit(1)
+        plan = bulk_rename.plan_undo(undo_log)
+    else:
+        paths = bulk_rename.scan(args.image_dir, args.glob)
         try:
-            _ = int(parts[1])
-            stem = f"{parts[0]}_{parts[1].zfill(4)}"
-            dst = src.with_stem(stem)
-            shutil.move(src, dst)
-        except ValueError:
-            rich.print(f"Could not rename: [bold red]{src}[/bold red]")
-            continue
+            plan = bulk_rename.plan_renames(paths, args.width)
+        except bulk_rename.CollisionError as err:
+            rich.print(f"[bold red]Nothing renamed:[/bold red]\n{err}")
+            sys.exit(1)
+
+    for src, dst in plan:
+        rich.print(f"{src.name} -> [bold]{dst.name}[/bold]")
+
+    if args.dry_run:
+        rich.print(f"Would rename {len(plan)} files")
+    elif args.undo:
+        bulk_rename.execute(plan, undo_log)
+        # The log now holds the undo itself, and undoing that would redo the run
+        undo_log.unlink()
+        rich.print(f"Put back {len(plan)} names")
+    elif plan:
+        bulk_rename.execute(plan, undo_log)
+        rich.print(f"Renamed {len(plan)} files, undo with --undo")
 
     log.finished()
 
@@ -48,6 +64,35 @@ def parse_args() -> argparse.Namespace:
         help="""What files to change. (default: %(default)s)""",
     )
 
+    arg_parser.add_argument(
+        "--width",
+        type=int,
+        default=4,
+        metavar="INT",
+        help="""Pad page numbers to at least this many digits.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="""Show the renames without doing them.""",
+    )
+
+    arg_parser.add_argument(
+        "--undo",
+        action="store_true",
+        help=f"""Put back the names from the last run. It is read from
+            {bulk_rename.UNDO_LOG} in the image directory.""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
     args = arg_parser.parse_args()
     return args
 
@@ -2,12 +2,21 @@
 
 import argparse
 import textwrap
-from datetime import datetime
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 
 import lmstudio as lms
 from rich.console import Console
 
+from parse.pylib import metrics
+from parse.pylib.ocr_batch import Batcher, batch_prompt, split_batch
+from parse.pylib.ocr_cache import OcrCache
+from parse.pylib.ocr_generate import DeadlineError, Generator
+from parse.pylib.ocr_hosts import HOST_ERRORS, HostPool
+from parse.pylib.ocr_manifest import Manifest
+from parse.pylib.ocr_prep import PREP_DIR, Prep
+
 PROMPT = (
     "You are given images of text. "
     "I want you to extract all of the text in each image. "
@@ -22,42 +31,268 @@ def main(args: argparse.Namespace) -> None:
 
     console = Console(log_path=False)
     console.log("[blue]Started")
-    job_started = datetime.now()
+    metrics.setup(args.metrics)
+    job_started = time.perf_counter()
+
+    manifest_path = args.manifest or args.ocr_text.with_name(
+        f"{args.ocr_text.name}.manifest.jsonl"
+    )
+    manifest = Manifest(manifest_path, restart=args.restart)
+
+    todo = [p for p in image_paths if not manifest.is_done(p)]
+    console.log(f"[blue]{len(image_paths) - len(todo)} images already done")
+
+    cache = None
+    if args.cache_dir:
+        cache = OcrCache(args.cache_dir, args.model_name, PROMPT, args.cache_max_mb)
+
+    prep = None
+    if args.max_side or args.grayscale:
+        prep = Prep(
+            args.max_side,
+            grayscale=args.grayscale,
+            quality=args.quality,
+            prep_dir=args.prep_dir,
+        )
+
+    errors = {}
+    batcher = Batcher(todo, args.batch_images, args.batch_tokens, prep)
+
+    generator = Generator(args.timeout, args.max_tokens, args.retries, args.backoff)
+    lms.set_sync_api_timeout(args.timeout)  # For a server that goes silent
+
+    hosts = HostPool(
+        args.api_host, args.model_name, args.workers, check_every=args.health_check
+    )
+
+    with hosts, manifest:
+        # The hosts' slots are the number of requests in flight at once. Batches
+        # are made as requests finish, so that they follow the batcher's current
+        # size. Each result goes into the manifest as soon as it finishes.
+        with ThreadPoolExecutor(max_workers=hosts.capacity) as executor:
+            running = {}
+            while True:
+                while len(running) < hosts.capacity and (batch := batcher.next_batch()):
+                    future = executor.submit(
+                        hosts.call,
+                        ocr_batch,
+                        batch,
+                        cache,
+                        prep=prep,
+                        generator=generator,
+                    )
+                    running[future] = batch
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    done = batch_results(future, running.pop(future), batcher)
+                    for image_path, results, ocr_time, ok in done:
+                        console.log(f"[blue]{'=' * 80}")
+                        console.log(f"[blue]{image_path}\n")
+
+                        manifest.record(image_path, results, ok=ok)
 
-    with lms.Client(args.api_host) as client:
-        model = client.llm.model(args.model_name)
+                        if not ok:
+                            errors[image_path] = results
+                            console.log(f"[red]{results}")
+                            continue
 
-        text = []
+                        console.log(f"[blue]OCR Time: {ocr_time:.2f}s")
+                        console.log(f"[green]{results}")
 
+    write_text(args.ocr_text, image_paths, manifest, errors)
+
+    if cache:
+        console.log(f"[blue]{cache.stats()}")
+
+    if errors:
+        console.log(f"[red]{len(errors)} images failed, rerun to retry them")
+
+    metrics.observe("ocr_job", time.perf_counter() - job_started, images=len(todo))
+    for line in metrics.lines():
+        console.log(f"[blue]{line}")
+    metrics.finish()
+    console.log("[blue]Finished")
+
+
+def write_text(
+    ocr_text: Path, image_paths: list[Path], manifest: Manifest, errors: dict
+) -> None:
+    """Write the text in image order, with the error for any image that failed."""
+    with ocr_text.open("w") as f:
         for image_path in image_paths:
-            ocr_start = datetime.now()
-            console.log(f"[blue]{'=' * 80}")
-            console.log(f"[blue]{image_path}\n")
-
-            handle = client.files.prepare_image(image_path)
-            chat = lms.Chat()
-            chat.add_user_message(PROMPT, images=[handle])
-
-            try:
-                results = model.respond(chat)
-            except lms.LMStudioServerError as err:
-                ocr_error = f"Server error: {err}"
-                console.log(f"[red]{ocr_error}")
-                text.append(ocr_error)
-                continue
-
-            text.append(results)
-            console.log(f"[blue]OCR Time: {datetime.now() - ocr_start}")
-            console.log(f"[green]{results}")
-
-    with args.ocr_text.open("w") as f:
-        for results in text:
-            f.write(str(results))
+            results = manifest.text(image_path)
+            f.write(errors.get(image_path, "") if results is None else results)
             f.write("\n")
-            f.flush()
 
-    console.log(f"\n[blue]Job Time: {datetime.now() - job_started}")
-    console.log("[blue]Finished")
+
+def batch_results(future: Future, batch: list[Path], batcher: Batcher) -> list[tuple]:
+    """Get a finished batch's results, or a failure for each image if no host could."""
+    try:
+        results, split = future.result()
+    except HOST_ERRORS as err:
+        # Every host the batch was sent to dropped out in the middle of it
+        return [(p, f"Host error: {err}", 0.0, False) for p in batch]
+    batcher.result(ok=split)
+    return results
+
+
+def ocr_batch(  # noqa: PLR0913
+    client: lms.Client,
+    model: lms.LLM,
+    batch: list[Path],
+    cache: OcrCache | None,
+    *,
+    prep: Prep | None = None,
+    generator: Generator | None = None,
+) -> tuple[list[tuple[Path, str, float, bool]], bool]:
+    """
+    OCR a batch of images with one request.
+
+    Returns (image, text, seconds, success) for each image, and whether the
+    answer could be split back into one text per image. When it can't, or the
+    request fails, each image is OCRed again on its own.
+    """
+    upload_paths = {p: prep.prepare(p) if prep else p for p in batch}
+
+    results = {}
+    keys = {p: cache.keys(u) for p, u in upload_paths.items()} if cache else {}
+    for image_path, (key, batched_key) in keys.items():
+        # Only a batch may reuse the text that was split out of another batch
+        lookup = (key, batched_key) if len(batch) > 1 else (key,)
+        if (text := cache.get(*lookup)) is not None:
+            metrics.count("cache_hits")
+            results[image_path] = (image_path, text, 0.0, True)
+
+    todo = [p for p in batch if p not in results]
+    split = True
+
+    if len(todo) > 1:
+        with metrics.span("ocr_batch", images=len(todo)) as span:
+            uploads = [upload_paths[p] for p in todo]
+            texts = respond_batch(client, model, uploads, generator)
+            span.fields["ok"] = texts is not None
+
+        if texts is None:
+            metrics.count("batch_failures")
+            split = False
+        else:
+            for image_path, text in zip(todo, texts, strict=True):
+                if cache:
+                    cache.put(keys[image_path][1], text)
+                seconds = span.seconds / len(todo)
+                results[image_path] = (image_path, text, seconds, True)
+            todo = []
+
+    # Single images, and the images of a failed batch, one at a time. They were
+    # already looked up in the cache, so only their keys are passed on.
+    for image_path in todo:
+        text, seconds, ok = ocr_image(
+            client,
+            model,
+            image_path,
+            cache,
+            prep=prep,
+            generator=generator,
+            missed=keys[image_path][0] if cache else None,
+        )
+        results[image_path] = (image_path, text, seconds, ok)
+
+    return [results[p] for p in batch], split
+
+
+def respond_batch(
+    client: lms.Client,
+    model: lms.LLM,
+    upload_paths: list[Path],
+    generator: Generator | None = None,
+) -> list[str] | None:
+    """Ask the model for the text of several images, split back per image."""
+    handles = []
+    for upload_path in upload_paths:
+        with metrics.span("upload", image=upload_path.name):
+            handles.append(client.files.prepare_image(upload_path))
+        metrics.count("upload_bytes", upload_path.stat().st_size)
+
+    chat = lms.Chat()
+    chat.add_user_message(batch_prompt(PROMPT, len(handles)), images=handles)
+
+    generator = generator or Generator()
+    try:
+        results = generator.respond(model, chat, images=len(handles))
+    except HOST_ERRORS:
+        raise
+    except (lms.LMStudioServerError, DeadlineError):
+        metrics.count("server_errors")
+        return None
+
+    return split_batch(results, len(handles))
+
+
+def ocr_image(  # noqa: PLR0913
+    client: lms.Client,
+    model: lms.LLM,
+    image_path: Path,
+    cache: OcrCache | None,
+    *,
+    prep: Prep | None = None,
+    generator: Generator | None = None,
+    missed: str | None = None,
+) -> tuple[str, float, bool]:
+    """
+    OCR one image, returning the text, seconds taken, and success.
+
+    `missed` is the image's cache key when the caller has already looked it up
+    and not found it, so that the cache is not searched twice.
+    """
+    with metrics.span("ocr_image", image=image_path.name) as span:
+        upload_path = prep.prepare(image_path) if prep else image_path
+        results, ok, source = respond(
+            client, model, upload_path, cache, generator, missed=missed
+        )
+        span.fields |= {"ok": ok, "source": source}
+    return results, span.seconds, ok
+
+
+def respond(  # noqa: PLR0913
+    client: lms.Client,
+    model: lms.LLM,
+    image_path: Path,
+    cache: OcrCache | None,
+    generator: Generator | None = None,
+    *,
+    missed: str | None = None,
+) -> tuple[str, bool, str]:
+    """Get the text from the cache or upload the image and ask the model for it."""
+    key = missed
+    if cache and not key:
+        key = cache.key(image_path)
+        if (results := cache.get(key)) is not None:
+            metrics.count("cache_hits")
+            return results, True, "cache"
+
+    with metrics.span("upload", image=image_path.name):
+        handle = client.files.prepare_image(image_path)
+    metrics.count("upload_bytes", image_path.stat().st_size)
+
+    chat = lms.Chat()
+    chat.add_user_message(PROMPT, images=[handle])
+
+    generator = generator or Generator()
+    try:
+        results = generator.respond(model, chat, image=image_path.name)
+    except HOST_ERRORS:
+        raise
+    except (lms.LMStudioServerError, DeadlineError) as err:
+        metrics.count("server_errors")
+        return f"Server error: {err}", False, "server"
+
+    if cache:
+        cache.put(key, results)
+
+    return results, True, "server"
 
 
 def parse_args() -> argparse.Namespace:
@@ -92,8 +327,161 @@ def parse_args() -> argparse.Namespace:
 
     arg_parser.add_argument(
         "--api-host",
-        default="localhost:1234",
-        help="""URL for the LM model. (default: %(default)s)""",
+        nargs="+",
+        default=["localhost:1234"],
+        metavar="HOST",
+        help="""URL for the LM model. Give several to share the work among
+            several LM Studio servers. Add "=N" to a host to let it have N requests
+            in flight instead of --workers, like "gpu2:1234=4".
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""How many images to have in flight to each server at once.
+            Set this to the number of parallel requests the server is configured
+            to handle. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--health-check",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="""How often to check that the servers are up, and to reconnect to
+            the ones that went down. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--manifest",
+        type=Path,
+        metavar="PATH",
+        help="""Record finished images in this file so that an interrupted run
+            can pick up where it left off. (default: the --ocr-text path with
+            ".manifest.jsonl" appended)""",
+    )
+
+    arg_parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="""Ignore any existing manifest and OCR every image again.""",
+    )
+
+    arg_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        metavar="DIR",
+        help="""Cache OCR results in this directory. Images whose content, model,
+            and prompt match a cached result are not sent to the server again.""",
+    )
+
+    arg_parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=512.0,
+        metavar="MB",
+        help="""Remove the least recently used cache entries when the cache
+            grows past this size. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--timeout",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help="""Cancel a response that takes longer than this.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=4096,
+        metavar="INT",
+        help="""Stop a response that runs past this many tokens, which stops a
+            model that starts repeating itself. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        metavar="INT",
+        help="""Retry a failed or timed out response this many times.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="""Wait up to this long before the first retry, doubling for each
+            retry after that. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--batch-images",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""Send up to this many consecutive images in one request. Each
+            description subdirectory is OCRed separately, so a batch never mixes
+            descriptions. The batch size shrinks when the model's answer can't be
+            split back into one text per image, and those images are retried one
+            at a time. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--batch-tokens",
+        type=int,
+        default=8192,
+        metavar="INT",
+        help="""Keep each batch under about this many vision tokens, estimated
+            from the image sizes. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--max-side",
+        type=int,
+        metavar="PX",
+        help="""Scale images down so that their longest side is at most this many
+            pixels before uploading them. Set it to the model's vision input
+            size.""",
+    )
+
+    arg_parser.add_argument(
+        "--grayscale",
+        action="store_true",
+        help="""Convert images to grayscale before uploading them.""",
+    )
+
+    arg_parser.add_argument(
+        "--quality",
+        type=int,
+        default=85,
+        metavar="INT",
+        help="""The JPEG quality of images scaled by --max-side or --grayscale.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--prep-dir",
+        type=Path,
+        default=PREP_DIR,
+        metavar="DIR",
+        help="""Keep the scaled images here so they are only made once.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
     )
 
     args = arg_parser.parse_args()
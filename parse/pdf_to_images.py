@@ -1,18 +1,53 @@
 #!/usr/bin/env python3
 
 import argparse
+import logging
+import math
 import os
+import subprocess
+import sys
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
 import rich
-from pylib import log
+
+from parse.pylib import log, metrics
+from parse.pylib.pdf_index import INDEX, PdfIndex
+from parse.pylib.pdf_util import page_count
+
+
+@dataclass
+class Render:
+    pages: int
+    started: float = math.inf
+    finished: float = -math.inf
+
+    @property
+    def seconds(self) -> float:
+        return max(self.finished - self.started, 0.0)
 
 
 def main(args: argparse.Namespace) -> None:
-    log.started()
+    log.started(args.metrics)
 
-    pdf_to_images(args.in_pdf, args.image_dir)
+    if args.in_pdf:
+        pdfs = [args.in_pdf]
+    else:
+        pdfs = unique_pdfs(sorted(args.pdf_dir.glob(args.glob)), args.pdf_dir)
+        if not args.force:
+            todo = [p for p in pdfs if not up_to_date(p, args.image_dir)]
+            logging.info("Skipping %d up to date PDFs", len(pdfs) - len(todo))
+            pdfs = todo
+
+    try:
+        renders = pdfs_to_images(pdfs, args.image_dir, args.jobs)
+    except subprocess.CalledProcessError:
+        sys.exit(1)
+
+    if args.pdf_dir:
+        summary(renders)
 
     msg = "You may now want to remove pages that do not contain useful traits."
     rich.print(f"\n[bold yellow]{msg}[/bold yellow]\n")
@@ -20,13 +55,143 @@ def main(args: argparse.Namespace) -> None:
     log.finished()
 
 
-def pdf_to_images(in_pdf: Path, image_dir: Path) -> None:
-    stem = in_pdf.stem
-    dir_ = image_dir / stem
-    dst = dir_ / f"{stem}"
+def pdf_to_images(in_pdf: Path, image_dir: Path, jobs: int = 1) -> int:
+    """Render every page of a PDF to a JPEG and return the number of pages."""
+    renders = pdfs_to_images([in_pdf], image_dir, jobs)
+    return renders[in_pdf].pages
+
+
+def pdfs_to_images(
+    pdfs: list[Path], image_dir: Path, jobs: int = 1
+) -> dict[Path, Render]:
+    """
+    Render every page of the PDFs to JPEGs.
+
+    Each PDF is split into contiguous page ranges and all of the ranges are fed to
+    a pool of pdftocairo processes. Poppler names the images by page number, so
+    the output is identical to rendering each whole PDF at once.
+    """
+    renders = {}
+    tasks = []
+
+    for in_pdf in pdfs:
+        stem = in_pdf.stem
+        dir_ = image_dir / stem
+        dst = dir_ / f"{stem}"
+
+        dir_.mkdir(parents=True, exist_ok=True)
+
+        pages = page_count(in_pdf)
+        renders[in_pdf] = Render(pages)
+        metrics.count("pdf_bytes", in_pdf.stat().st_size)
+        tasks += [(in_pdf, dst, *r) for r in page_ranges(pages, jobs)]
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [(t[0], executor.submit(render_range, *t)) for t in tasks]
+        failed = [f.exception() for _, f in futures if f.exception()]
+
+    if failed:
+        raise failed[0]
+
+    for in_pdf, future in futures:
+        started, finished = future.result()
+        render = renders[in_pdf]
+        render.started = min(render.started, started)
+        render.finished = max(render.finished, finished)
+
+    return renders
+
+
+def unique_pdfs(pdfs: list[Path], pdf_dir: Path) -> list[Path]:
+    """
+    Drop the PDFs that are copies of another PDF, so each is rendered once.
+
+    A copy is either a link to a PDF that is already in the list, or a PDF that
+    dedup_pdfs.py found to be the same as another one.
+    """
+    index_path = pdf_dir / INDEX
+    copies = PdfIndex(index_path).copies() if index_path.exists() else {}
+
+    unique = []
+    seen = set()
+    for pdf in sorted(pdfs, key=lambda p: p.is_symlink()):
+        real = pdf.resolve()
+        if real in seen or pdf.absolute() in copies:
+            logging.info("Skipping duplicate %s", pdf.name)
+            continue
+        seen.add(real)
+        unique.append(pdf)
+    return sorted(unique)
+
+
+def up_to_date(in_pdf: Path, image_dir: Path) -> bool:
+    """Check if the PDF has an image for every page and they're newer than it."""
+    images = list((image_dir / in_pdf.stem).glob(f"{in_pdf.stem}-*.jpg"))
+    if not images:
+        return False
+    oldest = min(p.stat().st_mtime for p in images)
+    if oldest < in_pdf.stat().st_mtime:
+        return False
+    return len(images) == page_count(in_pdf)
+
+
+def summary(renders: dict[Path, Render]) -> None:
+    """Print the throughput of each PDF and of the whole batch."""
+    for in_pdf, render in renders.items():
+        rate = render.pages / render.seconds if render.seconds else 0.0
+        rich.print(
+            f"{in_pdf.name}: {render.pages} pages in {render.seconds:.1f}s "
+            f"({rate:.1f} pages/sec)"
+        )
+
+    pages = sum(r.pages for r in renders.values())
+    started = min((r.started for r in renders.values()), default=0.0)
+    finished = max((r.finished for r in renders.values()), default=0.0)
+    seconds = max(finished - started, 0.0)
+    rate = pages / seconds if seconds else 0.0
+    rich.print(
+        f"[bold]Total: {len(renders)} PDFs, {pages} pages in {seconds:.1f}s "
+        f"({rate:.1f} pages/sec)[/bold]"
+    )
+
+
+def page_ranges(pages: int, jobs: int) -> list[tuple[int, int]]:
+    """Split pages into at most jobs contiguous, 1-based, inclusive ranges."""
+    size = math.ceil(pages / max(jobs, 1)) or 1
+    return [
+        (first, min(first + size - 1, pages)) for first in range(1, pages + 1, size)
+    ]
 
-    os.system(f"mkdir -p {dir_}")  # noqa: S605
-    os.system(f"pdftocairo -jpeg {in_pdf} {dst}")  # noqa: S605
+
+def render_range(in_pdf: Path, dst: Path, first: int, last: int) -> tuple[float, float]:
+    """Render a range of pages with a pdftocairo process and return its start/end."""
+    cmd = ["pdftocairo", "-jpeg", "-f", str(first), "-l", str(last), in_pdf, dst]
+    fields = {"pdf": in_pdf.name, "first": first, "last": last}
+    with metrics.span("render_range", **fields) as span:
+        try:
+            subprocess.run(cmd, capture_output=True, text=True, check=True)  # noqa: S603
+        except subprocess.CalledProcessError as err:
+            span.fields["error"] = err.returncode
+            logging.error(  # noqa: TRY400
+                "%s pages %d-%d failed (exit %d): %s",
+                in_pdf.name,
+                first,
+                last,
+                err.returncode,
+                err.stderr.strip(),
+            )
+            raise
+
+    # pdftocairo does not time each page, so give each one the range's average
+    pages = last - first + 1
+    for page in range(first, last + 1):
+        metrics.observe("render_page", span.seconds / pages, pdf=in_pdf.name, page=page)
+    metrics.count("pages_rendered", pages)
+
+    logging.info(
+        "%s pages %d-%d rendered in %.1fs", in_pdf.name, first, last, span.seconds
+    )
+    return span.started, span.started + span.seconds
 
 
 def parse_args() -> argparse.Namespace:
@@ -41,14 +206,35 @@ def parse_args() -> argparse.Namespace:
         ),
     )
 
-    arg_parser.add_argument(
+    pdfs = arg_parser.add_mutually_exclusive_group(required=True)
+
+    pdfs.add_argument(
         "--in-pdf",
         type=Path,
-        required=True,
         metavar="PDF",
         help="""Which pdf file to convert to images.""",
     )
 
+    pdfs.add_argument(
+        "--pdf-dir",
+        type=Path,
+        metavar="DIR",
+        help="""Convert all of the PDFs in this directory. PDFs that already have
+            an image for every page, all newer than the PDF, are skipped.""",
+    )
+
+    arg_parser.add_argument(
+        "--glob",
+        default="*.pdf",
+        help="""Which files in --pdf-dir to convert. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="""Convert PDFs in --pdf-dir even if their images are up to date.""",
+    )
+
     arg_parser.add_argument(
         "--image-dir",
         type=Path,
@@ -57,6 +243,22 @@ def parse_args() -> argparse.Namespace:
         help="""Where to place the images.""",
     )
 
+    arg_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="INT",
+        help="""How many pdftocairo processes to run at once. Each PDF is split
+            into this many page ranges. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
     args = arg_parser.parse_args()
     return args
 
@@ -0,0 +1,910 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+import threading
+from collections.abc import Callable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import ExitStack
+from functools import partial
+from pathlib import Path
+from queue import Queue
+
+import lmstudio as lms
+
+from parse import (
+    ocr_images,
+    pdf_to_images,
+    rename_pdfs,
+    slices_to_images,
+)
+from parse.pylib import bulk_rename, log, metrics
+from parse.pylib.ocr_cache import OcrCache
+from parse.pylib.ocr_generate import Generator
+from parse.pylib.ocr_hosts import HOST_ERRORS, HostPool
+from parse.pylib.ocr_manifest import Manifest
+from parse.pylib.ocr_prep import Prep
+from parse.pylib.pdf_util import page_count
+from parse.pylib.pipeline_state import PipelineState, digest
+
+STAGES = ("rename", "render", "fix", "slice", "ocr")
+STREAMED = ("render", "fix", "slice", "ocr")
+DONE = None  # Tells a queue's consumer that nothing more is coming
+
+Crops = dict[str, tuple[Path, list]]
+
+
+def main(args: argparse.Namespace) -> None:
+    log.started(args.metrics)
+
+    state_path = args.state or args.work_dir / "pipeline.json"
+    state = PipelineState(state_path, checksum=args.checksum)
+    last = STAGES.index(args.until)
+
+    in_pdf = args.in_pdf
+    pages = []
+
+    try:
+        for stage in STAGES[: last + 1]:
+            if args.stream and stage in STREAMED:
+                if stage == "render":
+                    with metrics.span("stage", stage="stream"):
+                        stream_stages(in_pdf, state, args)
+                    if not args.dry_run:
+                        state.save()
+                continue
+            if stage == "slice" and not has_slices(args):
+                logging.warning("Stopping: draw the boxes with slice.py first")
+                break
+            with metrics.span("stage", stage=stage):
+                match stage:
+                    case "rename":
+                        in_pdf = rename_stage(in_pdf, args)
+                    case "render":
+                        pages = render_stage(in_pdf, state, args)
+                    case "fix":
+                        pages = fix_stage(in_pdf, pages, state, args)
+                    case "slice":
+                        slice_stage(state, args)
+                    case "ocr":
+                        ocr_stage(state, args)
+            if not args.dry_run:
+                state.save()
+    except subprocess.CalledProcessError:
+        sys.exit(1)
+
+    log.finished()
+
+
+def rename_stage(in_pdf: Path, args: argparse.Namespace) -> Path:
+    """Give the PDF a name that command line tools are happy with."""
+    new_path = rename_pdfs.clean_name(in_pdf)
+    if new_path == in_pdf:
+        return in_pdf
+    logging.info("rename: %s -> %s", in_pdf.name, new_path.name)
+    if args.dry_run:
+        return in_pdf
+    shutil.move(in_pdf, new_path)
+    metrics.count("renamed")
+    return new_path
+
+
+def render_stage(in_pdf: Path, state: PipelineState, args: argparse.Namespace) -> list:
+    """Render the pages again only when the PDF has changed."""
+    if not render_needed(in_pdf, state, args):
+        return state.stage("render")[str(in_pdf)]["outputs"]
+
+    if args.dry_run:
+        return state.stage("render").get(str(in_pdf), {}).get("outputs", [])
+
+    pdf_to_images.pdfs_to_images([in_pdf], args.work_dir / "pages", args.jobs)
+    return record_render(in_pdf, state, args)
+
+
+def render_needed(in_pdf: Path, state: PipelineState, args: argparse.Namespace) -> bool:
+    entry = state.stage("render").get(str(in_pdf), {})
+    key = state.fingerprint(in_pdf)
+    if not args.force and entry.get("key") == key and all_exist(entry["outputs"]):
+        logging.info("render: %s is up to date", in_pdf.name)
+        return False
+    logging.info("render: %s", in_pdf.name)
+    return True
+
+
+def record_render(
+    in_pdf: Path, state: PipelineState, args: argparse.Namespace
+) -> list[str]:
+    built = state.stage("render")
+    entry = built.get(str(in_pdf), {})
+    page_dir = args.work_dir / "pages" / in_pdf.stem
+    outputs = [str(p) for p in sorted(page_dir.glob(f"{in_pdf.stem}-*.jpg"))]
+    remove_stale(entry.get("outputs", []), outputs)
+    built[str(in_pdf)] = {"key": state.fingerprint(in_pdf), "outputs": outputs}
+    return outputs
+
+
+def fix_stage(
+    in_pdf: Path, pages: list[str], state: PipelineState, args: argparse.Namespace
+) -> list[str]:
+    """Zero pad the page numbers of newly rendered pages."""
+    built = state.stage("fix")
+    key = digest(pages)
+    entry = built.get(str(in_pdf), {})
+
+    if not args.force and entry.get("key") == key and all_exist(entry["outputs"]):
+        logging.info("fix: %s page numbers are up to date", in_pdf.name)
+        return entry["outputs"]
+
+    logging.info("fix: %d pages", len(pages))
+    if args.dry_run:
+        return pages
+
+    paths = [Path(p) for p in pages]
+    # pdftocairo already pads the page numbers to the width of the page count, so
+    # only pad to the widest number and leave its names alone
+    plan = bulk_rename.plan_renames(paths, width=1)
+    if plan:
+        bulk_rename.execute(plan, paths[0].parent / bulk_rename.UNDO_LOG)
+    renamed = dict(plan)
+    outputs = [str(renamed.get(p, p)) for p in paths]
+    built[str(in_pdf)] = {"key": digest(outputs), "outputs": outputs}
+    return outputs
+
+
+def slice_stage(state: PipelineState, args: argparse.Namespace) -> None:
+    """Crop only the pages whose image or boxes changed."""
+    _, todo, gone = slice_plan(state, args)
+    if args.dry_run:
+        return
+
+    remove_gone(state, gone)
+
+    crop = partial(slices_to_images.crop_page, lossless=lossless(args))
+    pages = [p for p, _ in todo]
+    crops = [c for _, c in todo]
+
+    if args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(crop, pages, crops))
+    else:
+        results = list(map(crop, pages, crops))
+
+    for page_path, crops_, times in zip(pages, crops, results, strict=True):
+        slices_to_images.record_times(page_path, times, from_pdf=False)
+        record_slices(state, page_path, crops_)
+
+
+def slice_plan(
+    state: PipelineState, args: argparse.Namespace
+) -> tuple[list, list, list[str]]:
+    """
+    Work out which pages must be cropped again and which pages are gone.
+
+    A page's key covers its image and where each of its slices goes. Adding a
+    start box renumbers the description directories after it, which moves those
+    slices, so the pages after it are cropped again too.
+    """
+    with args.slices_json.open() as f:
+        slices = json.load(f)
+
+    slice_dir = args.work_dir / "slices"
+    slice_dir.mkdir(parents=True, exist_ok=True)
+    plan = slices_to_images.plan_slices(slices, slice_dir, args.description_pattern)
+
+    built = state.stage("slice")
+    todo = []
+
+    for page_path, crops in plan:
+        entry = built.get(str(page_path), {})
+        if (
+            args.force
+            or not page_path.exists()
+            or entry.get("key") != page_key(state, page_path, crops)
+            or not all_exist([str(p) for _, p in crops])
+        ):
+            todo.append((page_path, crops))
+
+    planned = {str(p) for p, _ in plan}
+    gone = [p for p in built if p not in planned]
+    logging.info(
+        "slice: %d of %d pages changed, %d removed", len(todo), len(plan), len(gone)
+    )
+    return plan, todo, gone
+
+
+def page_key(state: PipelineState, page_path: Path, crops: list) -> str:
+    outputs = [str(p) for _, p in crops]
+    return digest([state.fingerprint(page_path), [c for c, _ in crops], outputs])
+
+
+def record_slices(state: PipelineState, page_path: Path, crops: list) -> None:
+    built = state.stage("slice")
+    page = str(page_path)
+    outputs = [str(p) for _, p in crops]
+    remove_stale(built.get(page, {}).get("outputs", []), outputs)
+    built[page] = {"key": page_key(state, page_path, crops), "outputs": outputs}
+
+
+def remove_gone(state: PipelineState, gone: list[str]) -> None:
+    built = state.stage("slice")
+    for page in gone:
+        remove_stale(built.pop(page)["outputs"], [])
+
+
+def lossless(args: argparse.Namespace) -> bool:
+    if args.lossless and not shutil.which("jpegtran"):
+        logging.warning("jpegtran not found, cropping without --lossless")
+        return False
+    return args.lossless
+
+
+def ocr_stage(state: PipelineState, args: argparse.Namespace) -> None:
+    """OCR each slice directory again, but only for the slices that changed."""
+    built = state.stage("ocr")
+
+    for slice_dir, images, changed in ocr_plan(state, args):
+        if args.dry_run:
+            continue
+
+        # The manifest would skip a re-cropped slice with the same name
+        ocr_text = ocr_text_path(slice_dir, args)
+        Manifest(manifest_path(ocr_text)).forget(images if args.force else changed)
+
+        ocr_text.parent.mkdir(parents=True, exist_ok=True)
+        run_ocr(slice_dir, ocr_text, args)
+
+        # Only the slices with a good result are built, the others are retried
+        manifest = Manifest(manifest_path(ocr_text))
+        for image in images:
+            if manifest.is_done(image):
+                built[str(image)] = state.fingerprint(image)
+            else:
+                built.pop(str(image), None)
+        state.save()
+
+    prune_ocr(state)
+
+
+def ocr_plan(
+    state: PipelineState, args: argparse.Namespace
+) -> list[tuple[Path, list[Path], list[Path]]]:
+    """Find the slice directories with changed or removed slices, or no text yet."""
+    built = state.stage("ocr")
+    slice_dirs = sorted(
+        {Path(p).parent for e in state.stage("slice").values() for p in e["outputs"]}
+    )
+
+    removed = {Path(p).parent for p in built if not Path(p).exists()}
+
+    plan = []
+    for slice_dir in slice_dirs:
+        images = sorted(slice_dir.glob("*.jpg"))
+        changed = [p for p in images if built.get(str(p)) != state.fingerprint(p)]
+        text = ocr_text_path(slice_dir, args)
+
+        if not (args.force or changed or slice_dir in removed or not text.exists()):
+            logging.info("ocr: %s is up to date", slice_dir.name)
+            continue
+
+        logging.info("ocr: %s, %d slices changed", slice_dir.name, len(changed))
+        plan.append((slice_dir, images, changed))
+
+    return plan
+
+
+def prune_ocr(state: PipelineState) -> None:
+    built = state.stage("ocr")
+    for image in [p for p in built if not Path(p).exists()]:
+        del built[image]
+
+
+def ocr_text_path(slice_dir: Path, args: argparse.Namespace) -> Path:
+    return args.work_dir / "ocr" / f"{slice_dir.name}.txt"
+
+
+def manifest_path(ocr_text: Path) -> Path:
+    return ocr_text.with_name(f"{ocr_text.name}.manifest.jsonl")
+
+
+def run_ocr(slice_dir: Path, ocr_text: Path, args: argparse.Namespace) -> None:
+    """OCR is run as its own script, it owns the LM Studio client and console."""
+    cmd = [
+        sys.executable,
+        Path(__file__).with_name("ocr_images.py"),
+        "--image-dir",
+        slice_dir,
+        "--ocr-text",
+        ocr_text,
+        "--model-name",
+        args.model_name,
+        "--api-host",
+        *args.api_host,
+        "--workers",
+        str(args.ocr_workers),
+        "--health-check",
+        str(args.health_check),
+        "--timeout",
+        str(args.timeout),
+        "--max-tokens",
+        str(args.max_tokens),
+        "--retries",
+        str(args.retries),
+        "--backoff",
+        str(args.backoff),
+    ]
+    if args.cache_dir:
+        cmd += ["--cache-dir", args.cache_dir]
+    if args.batch_images > 1:
+        cmd += ["--batch-images", str(args.batch_images)]
+    if args.max_side:
+        cmd += ["--max-side", str(args.max_side)]
+    if args.grayscale:
+        cmd += ["--grayscale"]
+    if args.metrics:
+        cmd += ["--metrics", args.metrics]
+    subprocess.run(cmd, check=True)  # noqa: S603
+
+
+def stream_stages(in_pdf: Path, state: PipelineState, args: argparse.Namespace) -> None:
+    """
+    Render, crop, and OCR at the same time instead of one stage after another.
+
+    The stages are joined by bounded queues of paths. Each page goes to the
+    croppers as soon as its page range is rendered, and each slice goes to the
+    OCR workers as soon as it is cropped. A stage that gets ahead blocks on a
+    full queue until the stage after it catches up, so the wall time approaches
+    that of the slowest stage. If any stage fails the others stop working but
+    keep draining their queues, so that nothing blocks forever.
+    """
+    render = render_needed(in_pdf, state, args)
+
+    last = STAGES.index(args.until)
+    crop = has_slices(args) and last >= STAGES.index("slice")
+    ocr = has_slices(args) and last >= STAGES.index("ocr")
+    plan, todo, gone = slice_plan(state, args) if crop else ([], [], [])
+
+    # When the pages are rendered again every page with boxes must be re-cropped
+    to_crop = {p.name: (p, c) for p, c in (plan if render else todo)}
+    recropped = {s for _, crops in to_crop.values() for _, s in crops}
+    # Directories that lose or gain slices need their OCR text written again
+    built = state.stage("slice")
+    touched = {s.parent for s in recropped}
+    for page in [*(str(p) for p, _ in to_crop.values()), *gone]:
+        touched |= {Path(s).parent for s in built.get(page, {}).get("outputs", [])}
+
+    pending = []
+    if ocr:
+        for slice_dir, images, changed in ocr_plan(state, args):
+            stale = images if args.force else changed
+            pending += [p for p in stale if p not in recropped]
+            touched.add(slice_dir)
+
+    if args.dry_run:
+        return
+
+    remove_gone(state, gone)
+
+    stream = Stream(state, args, to_crop)
+    if render:
+        produce = partial(stream.render, in_pdf)
+    else:
+        produce = partial(stream.feed, [p for p, _ in todo])
+
+    # Connect before starting the producers, or they would block on full queues
+    # with no one to take from them when the hosts can't be reached
+    with ExitStack() as stack:
+        hosts = None
+        if ocr:
+            lms.set_sync_api_timeout(args.timeout)  # For a server that goes silent
+            hosts = HostPool(
+                args.api_host,
+                args.model_name,
+                args.ocr_workers,
+                check_every=args.health_check,
+            )
+            stack.enter_context(hosts)
+        stream.run(produce, pending, hosts)
+
+    if render:
+        record_render(in_pdf, state, args)
+
+    if ocr:
+        stream.write_texts(touched)
+        prune_ocr(state)
+
+
+class Stream:
+    """The queues and workers of a streaming run."""
+
+    def __init__(
+        self, state: PipelineState, args: argparse.Namespace, to_crop: Crops
+    ) -> None:
+        self.state = state
+        self.args = args
+        self.jobs = max(args.jobs, 1)
+        self.to_crop = to_crop
+        self.pages: Queue = Queue(maxsize=args.queue_size)
+        self.slices: Queue = Queue(maxsize=args.queue_size)
+        self.lock = threading.Lock()
+        self.failed = threading.Event()
+        self.error: BaseException | None = None
+        self.manifests: dict[Path, Manifest] = {}
+        self.stack = ExitStack()
+        self.errors: dict[Path, str] = {}
+        self.ocred: set[Path] = set()
+
+    def fail(self, err: BaseException) -> None:
+        with self.lock:
+            self.error = self.error or err
+        self.failed.set()
+
+    def run(
+        self, produce: Callable, pending: list[Path], hosts: HostPool | None
+    ) -> None:
+        """Run the producers, croppers, and OCR workers until they all finish."""
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            producer = executor.submit(produce)
+            feeder = executor.submit(self.feed_slices, pending)
+            cropper = executor.submit(self.crop_all)
+
+            try:
+                if hosts:
+                    self.ocr_all(hosts, [feeder, cropper])
+                else:
+                    self.drain_slices([feeder, cropper])
+            except BaseException as err:
+                # Release the producers that are blocked on a full queue
+                self.fail(err)
+                self.drain_slices([feeder, cropper])
+                raise
+
+        for future in (producer, feeder, cropper):
+            future.result()
+        if self.error:
+            raise self.error
+
+    def render(self, in_pdf: Path) -> None:
+        """Render short page ranges and hand each page on when its range is done."""
+        try:
+            pages = page_count(in_pdf)
+            page_dir = self.args.work_dir / "pages" / in_pdf.stem
+            page_dir.mkdir(parents=True, exist_ok=True)
+            dst = page_dir / in_pdf.stem
+            digits = len(str(pages))  # pdftocairo pads the page numbers this much
+            chunks = math.ceil(pages / self.args.chunk_pages)
+            ranges = iter(pdf_to_images.page_ranges(pages, chunks))
+            metrics.count("pdf_bytes", in_pdf.stat().st_size)
+
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                running = {}
+                while not self.failed.is_set():
+                    while len(running) < self.jobs and (r := next(ranges, None)):
+                        task = executor.submit(
+                            pdf_to_images.render_range, in_pdf, dst, *r
+                        )
+                        running[task] = r
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for task in finished:
+                        first, last = running.pop(task)
+                        task.result()
+                        for page in range(first, last + 1):
+                            self.pages.put(
+                                page_dir / f"{dst.name}-{page:0{digits}d}.jpg"
+                            )
+        except BaseException as err:
+            self.fail(err)
+            raise
+        finally:
+            for _ in range(self.jobs):
+                self.pages.put(DONE)
+
+    def feed(self, pages: list[Path]) -> None:
+        """Hand on the pages to crop again when they are already rendered."""
+        try:
+            for page in pages:
+                if self.failed.is_set():
+                    break
+                self.pages.put(page)
+        finally:
+            for _ in range(self.jobs):
+                self.pages.put(DONE)
+
+    def feed_slices(self, slices: list[Path]) -> None:
+        """OCR unchanged slices that have no text yet while the pages render."""
+        for slice_path in slices:
+            if self.failed.is_set():
+                break
+            self.slices.put(slice_path)
+
+    def crop_all(self) -> None:
+        """Crop in threads, decoding and encoding the JPEGs releases the GIL."""
+        lossless_ = lossless(self.args)
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for _ in range(self.jobs):
+                executor.submit(self.crop_pages, lossless_)
+
+    def crop_pages(self, lossless_: bool) -> None:  # noqa: FBT001
+        for page in drain(self.pages):
+            if self.failed.is_set() or page.name not in self.to_crop:
+                continue
+            page_path, crops = self.to_crop[page.name]
+            try:
+                times = slices_to_images.crop_page(page_path, crops, lossless=lossless_)
+                slices_to_images.record_times(page_path, times, from_pdf=False)
+                with self.lock:
+                    record_slices(self.state, page_path, crops)
+                for _, slice_path in crops:
+                    self.slices.put(slice_path)
+            except Exception as err:  # noqa: BLE001
+                self.fail(err)
+
+    def close_slices(self, producers: list, workers: int) -> None:
+        wait(producers)
+        for _ in range(workers):
+            self.slices.put(DONE)
+
+    def drain_slices(self, producers: list) -> None:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            executor.submit(self.close_slices, producers, 1)
+            for _ in drain(self.slices):
+                pass
+
+    def ocr_all(self, hosts: HostPool, producers: list) -> None:
+        cache = None
+        if self.args.cache_dir:
+            cache = OcrCache(
+                self.args.cache_dir, self.args.model_name, ocr_images.PROMPT
+            )
+
+        prep = None
+        if self.args.max_side or self.args.grayscale:
+            prep = Prep(self.args.max_side, grayscale=self.args.grayscale)
+
+        generator = Generator(
+            self.args.timeout,
+            self.args.max_tokens,
+            self.args.retries,
+            self.args.backoff,
+        )
+
+        workers = hosts.capacity
+        ocr = partial(self.ocr_slices, hosts, cache, prep, generator)
+        with self.stack, ThreadPoolExecutor(max_workers=workers + 1) as executor:
+            executor.submit(self.close_slices, producers, workers)
+            for _ in range(workers):
+                executor.submit(ocr)
+
+    def ocr_slices(
+        self,
+        hosts: HostPool,
+        cache: OcrCache | None,
+        prep: Prep | None,
+        generator: Generator,
+    ) -> None:
+        for slice_path in drain(self.slices):
+            if self.failed.is_set():
+                continue
+            try:
+                text, ok = self.ocr_slice(slice_path, hosts, cache, prep, generator)
+                self.manifest(slice_path).record(slice_path, text, ok=ok)
+                with self.lock:
+                    self.ocred.add(slice_path)
+                    if ok:
+                        fingerprint = self.state.fingerprint(slice_path)
+                        self.state.stage("ocr")[str(slice_path)] = fingerprint
+                    else:
+                        self.errors[slice_path] = text
+            except Exception as err:  # noqa: BLE001
+                self.fail(err)
+
+    @staticmethod
+    def ocr_slice(
+        slice_path: Path,
+        hosts: HostPool,
+        cache: OcrCache | None,
+        prep: Prep | None,
+        generator: Generator,
+    ) -> tuple[str, bool]:
+        try:
+            text, _, ok = hosts.call(
+                ocr_images.ocr_image,
+                slice_path,
+                cache,
+                prep=prep,
+                generator=generator,
+            )
+        except HOST_ERRORS as err:
+            # Every host it was sent to dropped out, so it is retried next run
+            return f"Host error: {err}", False
+        return text, ok
+
+    def manifest(self, slice_path: Path) -> Manifest:
+        with self.lock:
+            slice_dir = slice_path.parent
+            if slice_dir not in self.manifests:
+                ocr_text = ocr_text_path(slice_dir, self.args)
+                manifest = Manifest(manifest_path(ocr_text))
+                self.manifests[slice_dir] = self.stack.enter_context(manifest)
+            return self.manifests[slice_dir]
+
+    def write_texts(self, slice_dirs: set[Path]) -> None:
+        """Write the text of every slice directory that changed, in slice order."""
+        for slice_dir in sorted({p.parent for p in self.ocred} | slice_dirs):
+            if not slice_dir.exists():
+                continue
+            ocr_text = ocr_text_path(slice_dir, self.args)
+            ocr_text.parent.mkdir(parents=True, exist_ok=True)
+            manifest = Manifest(manifest_path(ocr_text))
+            images = sorted(slice_dir.glob("*.jpg"))
+            ocr_images.write_text(ocr_text, images, manifest, self.errors)
+
+
+def drain(queue: Queue) -> Iterator:
+    while (item := queue.get()) is not DONE:
+        yield item
+
+
+def has_slices(args: argparse.Namespace) -> bool:
+    return bool(args.slices_json and args.slices_json.exists())
+
+
+def all_exist(paths: list[str]) -> bool:
+    return all(Path(p).exists() for p in paths)
+
+
+def remove_stale(old: list[str], new: list[str]) -> None:
+    """Delete outputs from the last build that this build did not make."""
+    for path in set(old) - set(new):
+        Path(path).unlink(missing_ok=True)
+        metrics.count("stale_removed")
+
+
+def parse_args() -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        allow_abbrev=True,
+        description=textwrap.dedent(
+            """
+            Run the whole parse pipeline for a PDF, like make does. The stages are:
+            rename the PDF, render its pages, fix the page numbers, crop the slices,
+            and OCR the slices. Each stage remembers the inputs it was last built
+            from and only redoes the files whose inputs changed. So after editing
+            one page's boxes in slice.py, only that page's slices are cropped and
+            OCRed again.
+            """,
+        ),
+    )
+
+    arg_parser.add_argument(
+        "--in-pdf",
+        type=Path,
+        required=True,
+        metavar="PDF",
+        help="""The PDF to parse.""",
+    )
+
+    arg_parser.add_argument(
+        "--work-dir",
+        type=Path,
+        required=True,
+        metavar="DIR",
+        help="""Put the pages, slices, and OCR text in subdirectories of this
+            directory.""",
+    )
+
+    arg_parser.add_argument(
+        "--slices-json",
+        type=Path,
+        metavar="PATH",
+        help="""The boxes drawn with slice.py. The pipeline stops after rendering
+            the pages until this file exists.""",
+    )
+
+    arg_parser.add_argument(
+        "--description-pattern",
+        metavar="PATTERN",
+        help="""Put the slices for each description into a subdirectory with this
+            pattern, like slices_to_images.py does.""",
+    )
+
+    arg_parser.add_argument(
+        "--until",
+        choices=STAGES,
+        default=STAGES[-1],
+        help="""Stop after this stage. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="""Redo every stage even if its inputs have not changed.""",
+    )
+
+    arg_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="""Only log what each stage would do. Stages after one that would
+            change files may do more than is shown.""",
+    )
+
+    arg_parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="""Render, crop, and OCR at the same time. Pages go to be cropped as
+            soon as they are rendered, and slices go to be OCRed as soon as they
+            are cropped. The fix stage is skipped.""",
+    )
+
+    arg_parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        metavar="INT",
+        help="""With --stream, how many pages or slices may wait between two
+            stages before the earlier stage waits. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--chunk-pages",
+        type=int,
+        default=4,
+        metavar="INT",
+        help="""With --stream, render this many pages with each pdftocairo
+            process. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="""Decide what changed by hashing file contents instead of comparing
+            sizes and modification times.""",
+    )
+
+    arg_parser.add_argument(
+        "--state",
+        type=Path,
+        metavar="PATH",
+        help="""Where to keep what each stage built. (default: pipeline.json in
+            the --work-dir)""",
+    )
+
+    arg_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="INT",
+        help="""How many processes to render and crop with. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--lossless",
+        action="store_true",
+        help="""Crop JPEG pages with jpegtran, like slices_to_images.py does.""",
+    )
+
+    arg_parser.add_argument(
+        "--model-name",
+        default="noctrex/Chandra-OCR-GGUF",
+        help="""Use this language model for OCR. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--api-host",
+        nargs="+",
+        default=["localhost:1234"],
+        metavar="HOST",
+        help="""URL for the LM model. Give several to share the OCR among several
+            LM Studio servers, like ocr_images.py does. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--ocr-workers",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""How many OCR requests to send to each server at once.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        metavar="DIR",
+        help="""Cache OCR results here, like ocr_images.py does.""",
+    )
+
+    arg_parser.add_argument(
+        "--batch-images",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""OCR up to this many slices of a description in one request, like
+            ocr_images.py does. Not used with --stream. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--max-side",
+        type=int,
+        metavar="PX",
+        help="""Scale slices down to this many pixels on their longest side
+            before OCR, like ocr_images.py does.""",
+    )
+
+    arg_parser.add_argument(
+        "--grayscale",
+        action="store_true",
+        help="""Convert slices to grayscale before OCR.""",
+    )
+
+    arg_parser.add_argument(
+        "--health-check",
+        type=float,
+        default=30.0,
+        metavar="SECONDS",
+        help="""How often to check that the servers are up, like ocr_images.py
+            does. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--timeout",
+        type=float,
+        default=300.0,
+        metavar="SECONDS",
+        help="""Cancel an OCR response that takes longer than this.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=4096,
+        metavar="INT",
+        help="""Stop an OCR response that runs past this many tokens.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        metavar="INT",
+        help="""Retry a failed or timed out OCR response this many times.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.0,
+        metavar="SECONDS",
+        help="""Wait up to this long before the first retry, doubling for each
+            retry after that. (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
+    args = arg_parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    main(ARGS)
@@ -0,0 +1,131 @@
+import fnmatch
+import json
+import os
+import re
+import secrets
+from collections import defaultdict
+from pathlib import Path
+
+from . import metrics
+
+DIGITS = re.compile(r"(\d+)")
+UNDO_LOG = ".renames.jsonl"
+
+Rename = tuple[Path, Path]
+
+
+class CollisionError(Exception):
+    """Two files would end up with the same name."""
+
+
+def natural_key(name: str) -> tuple:
+    """Sort names with numbers in numeric order, so "p_2" comes before "p_10"."""
+    parts = DIGITS.split(name)
+    # split() puts the text at even indexes and the numbers at odd ones, so the
+    # keys of any two names compare position by position without mixing types
+    return tuple(int(p) if i % 2 else p for i, p in enumerate(parts)), name
+
+
+def scan(image_dir: Path, glob: str) -> list[Path]:
+    """List the matching files in a directory, in natural order."""
+    with os.scandir(image_dir) as entries:
+        names = [
+            e.name
+            for e in entries
+            if e.is_file() and fnmatch.fnmatch(e.name, glob) and not is_temp(e.name)
+        ]
+    return [image_dir / n for n in sorted(names, key=natural_key)]
+
+
+def plan_renames(paths: list[Path], width: int = 4) -> list[Rename]:
+    """
+    Zero pad the page numbers in the file names so that they sort in order.
+
+    The page number is the last number in a name, so "vol2-7" is page 7 of
+    "vol2". It is padded to at least `width` digits, or to the widest page number
+    of the document, and the rest of the name is left alone. Names without a
+    number are not renamed.
+    """
+    docs = defaultdict(list)
+    for path in paths:
+        parts = DIGITS.split(path.stem)
+        if len(parts) > 1:
+            doc = (path.parent, "".join(parts[:-2]), parts[-1], path.suffix)
+            docs[doc].append((path, parts))
+
+    plan = []
+    for pages in docs.values():
+        digits = max(width, *(len(str(int(parts[-2]))) for _, parts in pages))
+        for path, parts in pages:
+            stem = "".join([*parts[:-2], str(int(parts[-2])).zfill(digits), parts[-1]])
+            if stem != path.stem:
+                plan.append((path, path.with_stem(stem)))
+
+    check_collisions(paths, plan)
+    return plan
+
+
+def check_collisions(paths: list[Path], plan: list[Rename]) -> None:
+    """Make sure no rename lands on another file, or on another rename."""
+    moving = {src for src, _ in plan}
+    staying = {p for p in paths if p not in moving}
+    seen: dict[Path, Path] = {}
+    errors = []
+
+    for src, dst in plan:
+        if dst in seen:
+            errors.append(f"{seen[dst].name} and {src.name} would both be {dst.name}")
+        elif dst in staying or (dst.exists() and dst not in moving):
+            errors.append(f"{src.name} would overwrite {dst.name}")
+        seen[dst] = src
+
+    if errors:
+        raise CollisionError("\n".join(errors))
+
+
+def execute(plan: list[Rename], undo_log: Path) -> None:
+    """
+    Rename the files in two phases, through temporary names.
+
+    Moving every file out of the way first means that one rename never clobbers
+    a file that is about to be renamed itself. The plan is logged before anything
+    is renamed, so that a run can be undone even if it was interrupted.
+    """
+    token = secrets.token_hex(4)
+    steps = [(src, temp_name(src, token), dst) for src, dst in plan]
+
+    temp_log = undo_log.with_name(f"{undo_log.name}.tmp")
+    with temp_log.open("w") as f:
+        for src, temp, dst in steps:
+            record = {"src": str(src), "temp": str(temp), "dst": str(dst)}
+            f.write(json.dumps(record) + "\n")
+    temp_log.replace(undo_log)
+
+    with metrics.span("rename", files=len(steps)):
+        for src, temp, _ in steps:
+            src.rename(temp)
+        for _, temp, dst in steps:
+            temp.rename(dst)
+            metrics.count("renamed")
+
+
+def plan_undo(undo_log: Path) -> list[Rename]:
+    """Plan renaming the files in an undo log back to their old names."""
+    plan = []
+    with undo_log.open() as f:
+        for ln in f:
+            record = {k: Path(v) for k, v in json.loads(ln).items()}
+            current = next(
+                (p for p in (record["dst"], record["temp"]) if p.exists()), None
+            )
+            if current and current != record["src"]:
+                plan.append((current, record["src"]))
+    return plan
+
+
+def temp_name(path: Path, token: str) -> Path:
+    return path.with_name(f".{path.name}.{token}.renaming")
+
+
+def is_temp(name: str) -> bool:
+    return name.startswith(".") and name.endswith(".renaming")
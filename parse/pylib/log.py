@@ -2,6 +2,8 @@ import logging
 import sys
 from pathlib import Path
 
+from . import metrics
+
 
 def setup_logger(level: int = logging.INFO) -> None:
     logging.basicConfig(
@@ -15,11 +17,15 @@ def module_name() -> str:
     return Path(sys.argv[0]).name
 
 
-def started() -> None:
+def started(metrics_path: Path | None = None) -> None:
     setup_logger()
+    metrics.setup(metrics_path)
     logging.info("=" * 80)
     logging.info("%s started", module_name())
 
 
 def finished() -> None:
+    for line in metrics.lines():
+        logging.info(line)
+    metrics.finish()
     logging.info("%s finished", module_name())
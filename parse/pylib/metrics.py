@@ -0,0 +1,122 @@
+import json
+import math
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import TextIO
+
+
+@dataclass
+class Span:
+    name: str
+    fields: dict = field(default_factory=dict)
+    started: float = 0.0
+    seconds: float = 0.0
+
+
+class Metrics:
+    """
+    Timing and counting for the scripts.
+
+    Spans time a block of work, counters add up things like bytes or pages, and
+    every span duration is kept so that its p50, p95, and max can be reported at
+    the end of a run. If a metrics file is set up, every span is also written to
+    it as a JSON line as it finishes, followed by a summary line at the end.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: dict[str, float] = defaultdict(int)
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.sink: TextIO | None = None
+
+    def setup(self, path: Path | None) -> None:
+        if path:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.sink = path.open("a")
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self.lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, seconds: float, **fields: object) -> None:
+        with self.lock:
+            self.samples[name].append(seconds)
+        self.emit({"span": name, "seconds": round(seconds, 6), **fields})
+
+    @contextmanager
+    def span(self, name: str, **fields: object) -> Iterator[Span]:
+        """Time the block. The span's fields can be added to inside the block."""
+        span = Span(name, fields, time.perf_counter())
+        try:
+            yield span
+        finally:
+            span.seconds = time.perf_counter() - span.started
+            self.observe(name, span.seconds, **span.fields)
+
+    def emit(self, record: dict) -> None:
+        if not self.sink:
+            return
+        record = {"time": datetime.now().isoformat(timespec="milliseconds"), **record}
+        line = json.dumps(record, default=str)
+        with self.lock:
+            self.sink.write(line + "\n")
+            self.sink.flush()
+
+    def summary(self) -> dict:
+        with self.lock:
+            spans = {k: stats(v) for k, v in self.samples.items()}
+            return {"spans": spans, "counters": dict(self.counters)}
+
+    def lines(self) -> list[str]:
+        """Format the summary for a log."""
+        summary = self.summary()
+        lines = [
+            f"{name}: n={s['count']} total={s['total']:.3f}s p50={s['p50']:.3f}s "
+            f"p95={s['p95']:.3f}s max={s['max']:.3f}s"
+            for name, s in summary["spans"].items()
+        ]
+        lines += [f"{name}: {value:,}" for name, value in summary["counters"].items()]
+        return lines
+
+    def finish(self) -> None:
+        """Write the summary to the metrics file and close it."""
+        if self.sink:
+            self.emit({"summary": self.summary()})
+            self.sink.close()
+            self.sink = None
+
+
+def stats(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "total": sum(ordered),
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "max": ordered[-1] if ordered else 0.0,
+    }
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest rank percentile of sorted samples."""
+    if not ordered:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+# The scripts share one set of metrics per process
+METRICS = Metrics()
+setup = METRICS.setup
+count = METRICS.count
+observe = METRICS.observe
+span = METRICS.span
+summary = METRICS.summary
+lines = METRICS.lines
+finish = METRICS.finish
@@ -0,0 +1,87 @@
+import math
+import re
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+from parse.pylib.ocr_prep import Prep
+
+PATCH = 28  # Qwen-VL style models use about one vision token per 28x28 pixels
+MARKER = "=== IMAGE {} ==="
+MARKER_RE = re.compile(r"^\s*=== IMAGE (\d+) ===\s*$", flags=re.MULTILINE)
+
+
+class Batcher:
+    """
+    Hand out runs of consecutive images that fit in one OCR request.
+
+    A batch holds at most `size` images and about `max_tokens` vision tokens.
+    The size is halved when the answer for a batch cannot be split back into one
+    text per image, and it grows by one again after each batch that works.
+    """
+
+    def __init__(
+        self,
+        image_paths: list[Path],
+        max_images: int,
+        max_tokens: int,
+        prep: Prep | None = None,
+    ) -> None:
+        self.image_paths = image_paths
+        self.max_images = max(max_images, 1)
+        self.max_tokens = max_tokens
+        self.prep = prep
+        self.size = self.max_images
+        self.next = 0
+        self.lock = threading.Lock()
+
+    def next_batch(self) -> list[Path]:
+        """Get the next batch of images, or an empty list when there are none."""
+        with self.lock:
+            batch = []
+            tokens = 0
+            while self.next < len(self.image_paths) and len(batch) < self.size:
+                image_path = self.image_paths[self.next]
+                cost = self.tokens(image_path)
+                if batch and tokens + cost > self.max_tokens:
+                    break
+                batch.append(image_path)
+                tokens += cost
+                self.next += 1
+            return batch
+
+    def result(self, *, ok: bool) -> None:
+        with self.lock:
+            if ok:
+                self.size = min(self.size + 1, self.max_images)
+            else:
+                self.size = max(self.size // 2, 1)
+
+    def tokens(self, image_path: Path) -> int:
+        """Estimate the vision tokens for an image from its header."""
+        if self.max_images == 1:
+            return 0
+        with Image.open(image_path) as image:
+            size = image.size
+        width, height = self.prep.fit(size) if self.prep else size
+        return math.ceil(width / PATCH) * math.ceil(height / PATCH)
+
+
+def batch_prompt(prompt: str, count: int) -> str:
+    """Ask for the text of each image to follow a numbered marker line."""
+    marker = MARKER.format("N")
+    return (
+        f"{prompt} There are {count} images. Before the text of each image, output "
+        f"a line with only '{marker}', where N is the image number, starting at 1."
+    )
+
+
+def split_batch(text: str, count: int) -> list[str] | None:
+    """Split a batch answer into one text per image, or None if it is malformed."""
+    parts = MARKER_RE.split(text)
+    # parts is [preamble, number, text, number, text, ...]
+    numbers = [int(n) for n in parts[1::2]]
+    if numbers != list(range(1, count + 1)):
+        return None
+    return [t.strip() for t in parts[2::2]]
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+MB = 1024 * 1024
+LOW_WATER = 0.9  # Evict down to this fraction of the size limit
+
+
+class OcrCache:
+    """
+    A persistent cache of OCR results keyed by image content, model, and prompt.
+
+    Each entry is a text file named by its key. Reading an entry touches it, so
+    when the cache grows past its size limit the least recently used entries are
+    removed first. Eviction frees a tenth of the limit at once, so that a full
+    cache does not scan its directory on every write.
+    """
+
+    def __init__(
+        self, cache_dir: Path, model_name: str, prompt: str, max_mb: float = 512.0
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.prompt = prompt
+        self.max_bytes = int(max_mb * MB)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = sum(p.stat().st_size for p in self.entries())
+
+    def key(self, image_path: Path, *, batched: bool = False) -> str:
+        return self.keys(image_path)[batched]
+
+    def keys(self, image_path: Path) -> tuple[str, str]:
+        """
+        Key a result by the image, model, and prompt.
+
+        Text split out of a batch answer came from a different prompt than a
+        single image's, so it gets its own key. Both keys come from one read of
+        the image: (single image key, batched key).
+        """
+        digest = hashlib.sha256(image_path.read_bytes())
+        digest.update(b"\0" + self.model_name.encode())
+        digest.update(b"\0" + self.prompt.encode())
+        batched = digest.copy()
+        batched.update(b"\0batched")
+        return digest.hexdigest(), batched.hexdigest()
+
+    def entries(self) -> list[Path]:
+        return list(self.cache_dir.glob("*/*.txt"))
+
+    def entry(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.txt"
+
+    def get(self, *keys: str) -> str | None:
+        """Get the text of the first key that is cached, as one hit or miss."""
+        for key in keys:
+            path = self.entry(key)
+            try:
+                text = path.read_text()
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            with self.lock:
+                self.hits += 1
+            return text
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        path = self.entry(key)
+        path.parent.mkdir(exist_ok=True)
+
+        # Write then rename so a crash never leaves a partial entry
+        temp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        temp.write_text(text)
+        old_size = path.stat().st_size if path.exists() else 0
+        temp.replace(path)
+
+        with self.lock:
+            self.size += path.stat().st_size - old_size
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache is 90% full."""
+        stats = []
+        for path in self.entries():
+            try:
+                stats.append((path.stat(), path))
+            except FileNotFoundError:
+                continue
+        stats.sort(key=lambda s: s[0].st_mtime)
+
+        self.size = sum(s.st_size for s, _ in stats)
+        low_water = self.max_bytes * LOW_WATER
+        for stat, path in stats:
+            if self.size <= low_water:
+                break
+            path.unlink(missing_ok=True)
+            self.size -= stat.st_size
+            self.evictions += 1
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0.0
+        return (
+            f"Cache hits: {self.hits}, misses: {self.misses} ({rate:.1%} hit rate), "
+            f"evictions: {self.evictions}, size: {self.size / MB:.1f} MB"
+        )
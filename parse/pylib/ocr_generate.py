@@ -0,0 +1,82 @@
+import math
+import random
+import time
+from dataclasses import dataclass
+
+import lmstudio as lms
+
+from parse.pylib import metrics
+from parse.pylib.ocr_hosts import HOST_ERRORS
+
+TRUNCATED = "maxPredictedTokensReached"
+
+
+class DeadlineError(TimeoutError):
+    """A response took longer than its deadline."""
+
+
+@dataclass
+class Generator:
+    """
+    Stream a response from the model with a deadline, a token cap, and retries.
+
+    Reading the response as a stream lets a request be cancelled at its deadline,
+    and gives the time to the first token and the token rate of every image. A
+    server that sends nothing at all is caught by the SDK's own timeout, which the
+    host pool treats as the host being down.
+    """
+
+    timeout: float | None = 300.0
+    max_tokens: int | None = 4096
+    retries: int = 3
+    backoff: float = 1.0
+
+    def respond(self, model: lms.LLM, chat: lms.Chat, **fields: object) -> str:
+        """Get the response, retrying transient errors with exponential backoff."""
+        attempt = 0
+        while True:
+            try:
+                return self.stream(model, chat, **fields)
+            except HOST_ERRORS:
+                raise
+            except (lms.LMStudioServerError, DeadlineError):
+                if attempt >= self.retries:
+                    raise
+                metrics.count("retries")
+                # Full jitter keeps parallel workers from retrying in lockstep
+                time.sleep(random.uniform(0, self.backoff * 2**attempt))  # noqa: S311
+                attempt += 1
+
+    def stream(self, model: lms.LLM, chat: lms.Chat, **fields: object) -> str:
+        config = {"maxTokens": self.max_tokens} if self.max_tokens else None
+        deadline = time.perf_counter() + self.timeout if self.timeout else math.inf
+        first = None
+
+        with metrics.span("respond", **fields) as span:
+            # Closing the stream releases the prediction channel, even on a timeout
+            with model.respond_stream(chat, config=config) as prediction:
+                for _ in prediction:
+                    now = time.perf_counter()
+                    first = first or now
+                    if now > deadline:
+                        prediction.cancel()
+                        metrics.count("timeouts")
+                        msg = f"No complete response in {self.timeout:.0f}s"
+                        raise DeadlineError(msg)
+
+                result = prediction.result()
+                stats = result.stats
+                ttft = (first or time.perf_counter()) - span.started
+                span.fields |= {
+                    "ttft": round(ttft, 6),
+                    "tokens": stats.predicted_tokens_count,
+                    "tokens_per_sec": stats.tokens_per_second,
+                    "stop_reason": stats.stop_reason,
+                }
+
+        metrics.observe("ttft", ttft, **fields)
+        metrics.count("predicted_tokens", stats.predicted_tokens_count or 0)
+        if stats.stop_reason == TRUNCATED:
+            metrics.count("truncated")
+
+        return result.content
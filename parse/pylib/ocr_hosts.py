@@ -0,0 +1,169 @@
+import contextlib
+import logging
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Self
+
+import lmstudio as lms
+
+from parse.pylib import metrics
+
+# Errors that mean the host is gone, rather than that one request failed
+HOST_ERRORS = (
+    lms.LMStudioWebsocketError,
+    lms.LMStudioChannelClosedError,
+    lms.LMStudioTimeoutError,
+    lms.LMStudioOSError,
+    ConnectionError,
+)
+
+
+@dataclass
+class Host:
+    address: str
+    slots: int
+    client: lms.Client | None = None
+    model: Any = None
+    busy: int = 0
+    up: bool = False
+
+    @classmethod
+    def parse(cls, spec: str, slots: int) -> "Host":
+        """Read a host as "address" or "address=slots"."""
+        address, _, count = spec.partition("=")
+        return cls(address, int(count) if count else slots)
+
+
+class HostPool:
+    """
+    Share OCR requests among several LM Studio servers.
+
+    Each host takes up to its number of slots of requests at once. A request goes
+    to whichever live host has the most free slots, so a fast server takes more
+    of the work than a slow one. If a host drops out in the middle of a request,
+    the host is marked down and the request is run again on another host, up to
+    `requeues` times per host, so a request that kills every server it is sent
+    to fails instead of going around forever. A background thread checks the
+    hosts every so often, and reconnects to the ones that come back.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        specs: list[str],
+        model_name: str,
+        slots: int = 1,
+        *,
+        check_every: float = 30.0,
+        max_wait: float = 300.0,
+        requeues: int = 2,
+    ) -> None:
+        self.hosts = [Host.parse(s, slots) for s in specs]
+        self.model_name = model_name
+        self.check_every = check_every
+        self.max_wait = max_wait
+        self.requeues = requeues
+        self.cond = threading.Condition()
+        self.stop = threading.Event()
+        self.checker = threading.Thread(target=self.check_hosts, daemon=True)
+
+    def __enter__(self) -> Self:
+        with ThreadPoolExecutor(max_workers=len(self.hosts)) as executor:
+            errors = list(executor.map(self.connect, self.hosts))
+        if not any(h.up for h in self.hosts):
+            raise next(e for e in errors if e)
+        self.checker.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop.set()
+        if self.checker.is_alive():
+            self.checker.join()
+        for host in self.hosts:
+            self.disconnect(host)
+
+    @property
+    def capacity(self) -> int:
+        return sum(h.slots for h in self.hosts)
+
+    def call(self, fn: Callable, *args: object, **kwargs: object) -> Any:  # noqa: ANN401
+        """Run fn(client, model, ...) on a free host, moving on if the host dies."""
+        requeues = 0
+        while True:
+            host = self.acquire()
+            try:
+                return fn(host.client, host.model, *args, **kwargs)
+            except HOST_ERRORS as err:
+                self.mark_down(host, err)
+                requeues += 1
+                if requeues > len(self.hosts) * self.requeues:
+                    metrics.count("requeues_exhausted")
+                    raise
+                metrics.count("requeued")
+            finally:
+                self.release(host)
+
+    def acquire(self) -> Host:
+        """Wait for a free slot on a live host, and take it."""
+        deadline = time.monotonic() + self.max_wait
+        with self.cond:
+            while True:
+                free = [h for h in self.hosts if h.up and h.busy < h.slots]
+                if free:
+                    host = min(free, key=lambda h: h.busy / h.slots)
+                    host.busy += 1
+                    return host
+                if any(h.up for h in self.hosts):
+                    deadline = time.monotonic() + self.max_wait
+                elif time.monotonic() > deadline:
+                    msg = f"No LM Studio host came back in {self.max_wait:.0f}s"
+                    raise RuntimeError(msg)
+                self.cond.wait(timeout=1.0)
+
+    def release(self, host: Host) -> None:
+        with self.cond:
+            host.busy -= 1
+            self.cond.notify()
+
+    def connect(self, host: Host) -> Exception | None:
+        try:
+            client = lms.Client(host.address)
+            model = client.llm.model(self.model_name)
+        except (lms.LMStudioError, OSError) as err:
+            logging.warning("LM Studio host %s is down: %s", host.address, err)
+            return err
+        with self.cond:
+            host.client, host.model, host.up = client, model, True
+            self.cond.notify_all()
+        return None
+
+    def disconnect(self, host: Host) -> None:
+        client, host.client, host.model = host.client, None, None
+        if client:
+            with contextlib.suppress(lms.LMStudioError, OSError):
+                client.close()
+
+    def mark_down(self, host: Host, err: BaseException) -> None:
+        with self.cond:
+            if not host.up:
+                return
+            host.up = False
+            self.cond.notify_all()
+        logging.warning("LM Studio host %s went down: %s", host.address, err)
+        metrics.count("hosts_down")
+
+    def check_hosts(self) -> None:
+        """Make sure the live hosts still answer, and retry the dead ones."""
+        while not self.stop.wait(self.check_every):
+            for host in self.hosts:
+                if host.up:
+                    with metrics.span("host_check", host=host.address):
+                        try:
+                            host.client.list_loaded_models()
+                        except HOST_ERRORS as err:
+                            self.mark_down(host, err)
+                elif host.busy == 0:
+                    self.disconnect(host)
+                    self.connect(host)
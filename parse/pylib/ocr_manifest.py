@@ -0,0 +1,98 @@
+import json
+import threading
+from pathlib import Path
+from typing import Self
+
+CHUNK = 1 << 16
+
+
+class Manifest:
+    """
+    A sidecar file that records each OCR result as soon as it is finished.
+
+    The file is JSON lines, one record per finished image. Rerunning against the
+    same manifest skips images with a successful record. A later record for the
+    same image overrides an earlier one.
+    """
+
+    def __init__(self, path: Path, *, restart: bool = False) -> None:
+        self.path = path
+        self.done: dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.file = None
+
+        if restart:
+            self.path.unlink(missing_ok=True)
+        elif self.path.exists():
+            self.load()
+
+    def __enter__(self) -> Self:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.drop_partial_line()
+        self.file = self.path.open("a")
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.file.close()
+        self.file = None
+
+    @staticmethod
+    def key(image_path: Path) -> str:
+        return image_path.name
+
+    def load(self) -> None:
+        with self.path.open() as f:
+            for ln in f:
+                try:
+                    record = json.loads(ln)
+                except json.JSONDecodeError:
+                    continue  # A partial line from a crash
+                if record["ok"]:
+                    self.done[record["image"]] = record["text"]
+                else:
+                    self.done.pop(record["image"], None)
+
+    def drop_partial_line(self) -> None:
+        """Cut off a line half written by a crash, so the next record starts clean."""
+        if not self.path.exists():
+            return
+        with self.path.open("rb+") as f:
+            size = f.seek(0, 2)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Find the end of the last whole line, reading back a block at a time
+            end = size
+            while end > 0:
+                start = max(end - CHUNK, 0)
+                f.seek(start)
+                block = f.read(end - start)
+                if (i := block.rfind(b"\n")) >= 0:
+                    f.truncate(start + i + 1)
+                    return
+                end = start
+            f.truncate(0)
+
+    def is_done(self, image_path: Path) -> bool:
+        return self.key(image_path) in self.done
+
+    def text(self, image_path: Path) -> str | None:
+        return self.done.get(self.key(image_path))
+
+    def record(self, image_path: Path, text: str, *, ok: bool) -> None:
+        key = self.key(image_path)
+        line = json.dumps({"image": key, "ok": ok, "text": text}, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+            if ok:
+                self.done[key] = text
+
+    def forget(self, image_paths: list[Path]) -> None:
+        """Mark images as not done, so that they are OCRed again after changing."""
+        with self:
+            for image_path in image_paths:
+                self.record(image_path, "", ok=False)
+                self.done.pop(self.key(image_path), None)
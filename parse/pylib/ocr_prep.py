@@ -0,0 +1,86 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from PIL import Image
+
+from parse.pylib import metrics
+from parse.pylib.slice_page import CACHE_HOME
+
+PREP_DIR = CACHE_HOME / "pdf_parsers" / "ocr_inputs"
+
+
+class Prep:
+    """
+    Shrink images before they are uploaded for OCR.
+
+    Slices are often cut from high resolution scans and are much bigger than the
+    model's vision input, so the server scales them down anyway. Scaling them
+    here, optionally to grayscale, and re-encoding them cuts the upload size and
+    the server's image processing time. The prepared images are kept on disk and
+    reused until the source image or the settings change.
+    """
+
+    def __init__(
+        self,
+        max_side: int | None = None,
+        *,
+        grayscale: bool = False,
+        quality: int = 85,
+        prep_dir: Path = PREP_DIR,
+    ) -> None:
+        self.max_side = max_side
+        self.grayscale = grayscale
+        self.quality = quality
+        self.prep_dir = prep_dir
+
+    def prepare(self, image_path: Path) -> Path:
+        """Return the path of the image to upload, which may be the original."""
+        prepared = self.prep_path(image_path)
+        if prepared.exists():
+            metrics.count("prep_hits")
+            return prepared
+
+        with (
+            metrics.span("prep", image=image_path.name),
+            Image.open(image_path) as image,
+        ):
+            size = self.fit(image.size)
+            mode = "L" if self.grayscale else image.mode
+            if size == image.size and mode == image.mode:
+                return image_path
+
+            # Let the JPEG decoder scale down and drop the color as it decodes
+            image.draft("L" if self.grayscale else None, size)
+            out = image.convert("L" if self.grayscale else "RGB")
+            if out.size != size:
+                out = out.resize(size, Image.Resampling.LANCZOS)
+
+            prepared.parent.mkdir(parents=True, exist_ok=True)
+            temp = prepared.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            out.save(temp, format="JPEG", quality=self.quality)
+            temp.replace(prepared)
+
+        metrics.count(
+            "prep_saved_bytes", image_path.stat().st_size - prepared.stat().st_size
+        )
+        return prepared
+
+    def fit(self, size: tuple[int, int]) -> tuple[int, int]:
+        """Scale a size down so that its longest side is at most max_side."""
+        width, height = size
+        longest = max(width, height)
+        if not self.max_side or longest <= self.max_side:
+            return size
+        ratio = self.max_side / longest
+        return max(round(width * ratio), 1), max(round(height * ratio), 1)
+
+    def prep_path(self, image_path: Path) -> Path:
+        path = Path(image_path).resolve()
+        key = (
+            f"{path}|{path.stat().st_mtime_ns}|{self.max_side}|{self.grayscale}"
+            f"|{self.quality}"
+        )
+        digest = hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()
+        return self.prep_dir / digest[:2] / f"{digest}.jpg"
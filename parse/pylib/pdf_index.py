@@ -0,0 +1,104 @@
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import metrics
+
+INDEX = ".pdf_index.json"
+CHUNK = 1 << 20
+
+
+class PdfIndex:
+    """
+    Find the same document saved under different names.
+
+    Each PDF is keyed by its path and stores the SHA-256 of its contents along
+    with its size and modification time. A file is only hashed again when its
+    size or modification time changes, so updating the index for a large corpus
+    only reads the new and changed files.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.files: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        if self.path.exists():
+            with self.path.open() as f:
+                self.files = json.load(f)
+
+    def update(self, pdfs: Iterable[Path], jobs: int = 1) -> int:
+        """Hash the new and changed PDFs in parallel and forget the missing ones."""
+        pdfs = list(pdfs)
+        keep = {str(p) for p in pdfs}
+        self.files = {k: v for k, v in self.files.items() if k in keep}
+
+        todo = [p for p in pdfs if not self.fresh(p)]
+        with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            # hashlib releases the GIL on large buffers, so threads hash in parallel
+            list(executor.map(self.add, todo))
+        return len(todo)
+
+    def add(self, pdf: Path) -> None:
+        stat = pdf.stat()
+        with metrics.span("hash", pdf=pdf.name, size=stat.st_size):
+            sha256 = hash_file(pdf)
+        with self.lock:
+            self.files[str(pdf)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+            }
+        metrics.count("hashed")
+
+    def fresh(self, pdf: Path) -> bool:
+        """Check that the PDF is in the index and unchanged since it was hashed."""
+        entry = self.files.get(str(pdf))
+        if not entry:
+            return False
+        stat = pdf.stat()
+        return entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def duplicates(self) -> list[list[Path]]:
+        """
+        Get the groups of PDFs with the same contents.
+
+        The first PDF in each group is the one to keep, the rest are its copies.
+        """
+        groups = defaultdict(list)
+        for path, entry in self.files.items():
+            groups[entry["sha256"]].append(Path(path))
+        return [sorted(g, key=keep_order) for g in groups.values() if len(g) > 1]
+
+    def copies(self) -> dict[Path, Path]:
+        """Map each unchanged copy of a PDF to the PDF to use instead."""
+        return {
+            copy: group[0]
+            for group in self.duplicates()
+            if group[0].exists()
+            for copy in group[1:]
+            if copy.exists() and self.fresh(copy)
+        }
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(f"{self.path.name}.tmp")
+        with temp.open("w") as f:
+            json.dump(self.files, f, indent=2)
+        temp.replace(self.path)
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def keep_order(path: Path) -> tuple:
+    """Keep the copy nearest the top of the tree, then the first by name."""
+    return len(path.parts), str(path)
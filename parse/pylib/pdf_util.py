@@ -0,0 +1,44 @@
+import io
+import re
+import subprocess
+from pathlib import Path
+
+from PIL import Image
+
+DPI = 150  # pdftocairo's default resolution
+
+
+def page_count(in_pdf: Path) -> int:
+    result = subprocess.run(  # noqa: S603
+        ["pdfinfo", str(in_pdf)],  # noqa: S607
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    match = re.search(r"^Pages:\s+(\d+)", result.stdout, flags=re.MULTILINE)
+    return int(match.group(1))
+
+
+def page_no(image_path: Path) -> int:
+    """Get the PDF page number from the name of an image made by pdf_to_images."""
+    match = re.search(r"(\d+)$", image_path.stem)
+    if not match:
+        msg = f"No page number in image name: {image_path}"
+        raise ValueError(msg)
+    return int(match.group(1))
+
+
+def render_page(in_pdf: Path, page: int, dpi: int = DPI) -> Image.Image:
+    """
+    Render one PDF page into memory.
+
+    The page is piped from pdftocairo as a PNG, so it is the same size as the JPEG
+    that pdf_to_images writes but without the lossy encoding. (TIFF cannot be
+    written to a pipe because the writer has to seek.)
+    """
+    cmd = ["pdftocairo", "-png", "-singlefile"]
+    cmd += ["-r", str(dpi), "-f", str(page), "-l", str(page), str(in_pdf), "-"]
+    result = subprocess.run(cmd, capture_output=True, check=True)  # noqa: S603
+    image = Image.open(io.BytesIO(result.stdout))
+    image.load()
+    return image if image.mode in ("RGB", "L") else image.convert("RGB")
@@ -0,0 +1,52 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+
+CHUNK = 1 << 20
+
+
+class PipelineState:
+    """
+    What each pipeline stage last built, and from which inputs.
+
+    Every stage keeps its own section keyed by an input path. A stage compares a
+    fresh fingerprint of the input with the one stored here to decide whether the
+    input changed since it was last built. The file is rewritten after every
+    stage so an interrupted run keeps the work that did finish.
+    """
+
+    def __init__(self, path: Path, *, checksum: bool = False) -> None:
+        self.path = path
+        self.checksum = checksum
+        self.data: dict[str, dict[str, Any]] = {}
+        if self.path.exists():
+            with self.path.open() as f:
+                self.data = json.load(f)
+
+    def stage(self, name: str) -> dict[str, Any]:
+        return self.data.setdefault(name, {})
+
+    def fingerprint(self, path: Path) -> str:
+        """Identify a file's contents by its hash, or cheaply by size and mtime."""
+        if not self.checksum:
+            stat = path.stat()
+            return f"{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            while chunk := f.read(CHUNK):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_name(f"{self.path.name}.tmp")
+        with temp.open("w") as f:
+            json.dump(self.data, f, indent=2)
+        temp.replace(self.path)
+
+
+def digest(value: object) -> str:
+    """Hash anything JSON can encode, for comparing stage inputs."""
+    text = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
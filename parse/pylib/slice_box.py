@@ -4,7 +4,7 @@ TOO_SMALL = 20
 COORDS = tuple[int, int, int, int]
 
 
-@dataclass
+@dataclass(slots=True)
 class Box:
     id: int = -1  # Needed for tkinter
     x0: int = -1
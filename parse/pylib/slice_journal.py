@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import TextIO
+
+from parse.pylib.slice_page import Page
+from parse.pylib.slice_store import BoxStore
+
+
+class Journal:
+    """
+    An append-only log of the box edits made in the slice GUI.
+
+    Every add, delete, and start toggle is written as one compact JSON line as it
+    happens, so a crash loses nothing. Box coordinates are stored relative to the
+    image, like the project JSON, so the log does not depend on the window size,
+    and each edit names its page by the image path.
+
+    When the journal belongs to a project file it is compacted by writing a new
+    snapshot in a background thread. The current log is moved aside first and
+    only removed once the snapshot is safely replaced, so edits made during
+    compaction go into a fresh log. Until the user saves, the snapshot is an
+    autosave file next to the project, so the project itself only ever holds
+    what the user saved.
+    """
+
+    def __init__(
+        self, path: Path, snapshot: Path | None = None, compact_every: int = 500
+    ) -> None:
+        self.path = path
+        self.snapshot = snapshot
+        self.autosave = (
+            snapshot.with_name(f".{snapshot.name}.autosave{snapshot.suffix}")
+            if snapshot
+            else None
+        )
+        self.compacting = path.with_name(f"{path.name}.compacting")
+        self.compact_every = compact_every
+        self.count = 0
+        self.file: TextIO | None = None
+        self.thread: threading.Thread | None = None
+
+    @classmethod
+    def for_project(cls, project: Path) -> "Journal":
+        return cls(project.with_name(f"{project.name}.journal"), project)
+
+    @classmethod
+    def for_image_dir(cls, image_dir: Path) -> "Journal":
+        """Log edits for a directory that has not been saved as a project yet."""
+        return cls(image_dir / ".slices.journal")
+
+    def record(self, op: str, page: str, **kwargs: object) -> None:
+        """Log an edit to the page with this image path."""
+        if self.file is None:
+            self.file = self.path.open("a")
+        line = json.dumps({"op": op, "page": page, **kwargs}, separators=(",", ":"))
+        self.file.write(line + "\n")
+        self.file.flush()
+        self.count += 1
+
+    def due(self) -> bool:
+        return self.snapshot is not None and self.count >= self.compact_every
+
+    def base(self) -> Path | None:
+        """Get the snapshot the log applies to, the autosave if it is newer."""
+        if not (self.autosave and self.autosave.exists()):
+            return self.snapshot
+        if not self.snapshot.exists():
+            return self.autosave
+        newer = self.autosave.stat().st_mtime >= self.snapshot.stat().st_mtime
+        return self.autosave if newer else self.snapshot
+
+    def replay(self, pages: list[Page]) -> int:
+        """Apply logged edits to pages loaded from the snapshot."""
+        ops = []
+
+        # A leftover from a crash during compaction. It is only needed if the
+        # snapshot was not replaced after the log was moved aside.
+        if self.compacting.exists():
+            base = self.base()
+            snapshot_time = base.stat().st_mtime if base and base.exists() else 0.0
+            if self.compacting.stat().st_mtime > snapshot_time:
+                ops += self.read(self.compacting)
+
+        if self.path.exists():
+            ops += self.read(self.path)
+
+        by_path = {str(p.path): p for p in pages}
+        for op in ops:
+            apply(op, pages, by_path)
+
+        self.count = len(ops)
+        return len(ops)
+
+    @staticmethod
+    def read(path: Path) -> list[dict]:
+        ops = []
+        with path.open() as f:
+            for ln in f:
+                try:
+                    ops.append(json.loads(ln))
+                except json.JSONDecodeError:
+                    continue  # A partial line from a crash
+        return ops
+
+    def compact(
+        self, store: BoxStore, then: Callable | None = None, *, save: bool = False
+    ) -> None:
+        """
+        Write a snapshot in the background and start a new log.
+
+        The snapshot goes to the autosave file, or to the project itself when the
+        user saves. If given, then() is called after it is safely written.
+        """
+        self.wait()
+        self.close_file()
+
+        if self.path.exists():
+            if self.compacting.exists():  # Keep a crash leftover's edits too
+                with self.compacting.open("a") as f:
+                    f.write(self.path.read_text())
+                self.path.unlink()
+            else:
+                self.path.replace(self.compacting)
+
+        self.count = 0
+        self.thread = threading.Thread(
+            target=self.write_snapshot,
+            args=(store, self.snapshot if save else self.autosave, then),
+        )
+        self.thread.start()
+
+    def write_snapshot(
+        self, store: BoxStore, target: Path, then: Callable | None = None
+    ) -> None:
+        temp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        if target.suffix == ".npz":
+            with temp.open("wb") as out_npz:
+                store.save(out_npz)
+        else:
+            with temp.open("w") as out_json:
+                json.dump(store.to_dicts(), out_json, indent=4)
+        temp.replace(target)
+        self.compacting.unlink(missing_ok=True)
+        if target == self.snapshot:
+            self.autosave.unlink(missing_ok=True)
+        if then:
+            then()
+
+    def wait(self) -> None:
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def close_file(self) -> None:
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def close(self) -> None:
+        self.wait()
+        self.close_file()
+
+    def discard(self) -> None:
+        """Remove the log once its edits are saved somewhere else."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.compacting.unlink(missing_ok=True)
+        if self.autosave:
+            self.autosave.unlink(missing_ok=True)
+
+
+def apply(op: dict, pages: list[Page], by_path: dict[str, Page]) -> None:
+    # Pages are logged by path, so edits still land on the right page when
+    # images are added to or removed from the directory between sessions.
+    # Older journals logged the page's index.
+    if isinstance(op["page"], str):
+        page = by_path.get(op["page"])
+    elif 0 <= op["page"] < len(pages):
+        page = pages[op["page"]]
+    else:
+        return
+    if page is None:
+        return
+
+    match op["op"]:
+        case "add":
+            page.add_json_box(op["box"])
+        case "delete" if 0 <= op["index"] < len(page.boxes):
+            del page.boxes[op["index"]]
+        case "start" if 0 <= op["index"] < len(page.boxes):
+            page.boxes[op["index"]].start = op["start"]
@@ -1,21 +1,25 @@
+import hashlib
+import os
+import threading
+from functools import cached_property
 from pathlib import Path
 from typing import Literal
 
-from PIL import Image, ImageTk
+from PIL import Image
 
 from parse.pylib.slice_box import Box
 
 BoxSize = Literal["all", "largest", "smallest"]
 
+CACHE_HOME = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache"))
+PREVIEW_DIR = CACHE_HOME / "pdf_parsers" / "previews"
+
 
 class Page:
     def __init__(self, path: Path, canvas_height: int) -> None:
         self.path = path
         self.canvas_height = canvas_height
-        self.photo = None
-        self.image_height = -1
         self.boxes = []
-        self.resize(canvas_height)
 
     def as_dict(self) -> dict:
         return {
@@ -25,23 +29,71 @@ class Page:
             ],
         }
 
-    def resize(self, canvas_height: int) -> None:
-        if not self.photo:
-            image = Image.open(self.path)
-            image_width, image_height = image.size
-            self.image_height = image_height
-            ratio = canvas_height / image_height
-            new_width = int(image_width * ratio)
-            new_height = int(image_height * ratio)
-            resized = image.resize((new_width, new_height))
-            self.photo = ImageTk.PhotoImage(resized)
-
-    def filter_delete(self, x: int, y: int) -> None:
+    @cached_property
+    def image_size(self) -> tuple[int, int]:
+        """Read the image size from the file header without decoding the image."""
+        with Image.open(self.path) as image:
+            return image.size
+
+    @property
+    def image_height(self) -> int:
+        return self.image_size[1]
+
+    def resized(
+        self, canvas_height: int, preview_dir: Path | None = None
+    ) -> Image.Image:
+        """
+        Decode the image and scale it to the canvas height.
+
+        If there is a preview directory, the scaled image is saved there and reused
+        until the source image changes. Box coordinates are always relative to the
+        original image height, so a preview does not change them.
+        """
+        preview = self.preview_path(canvas_height, preview_dir) if preview_dir else None
+        if preview and preview.exists():
+            image = Image.open(preview)
+            image.load()
+            return image
+
+        image = Image.open(self.path)
+        image_width, image_height = image.size
+        ratio = canvas_height / image_height
+        new_width = int(image_width * ratio)
+        new_height = int(image_height * ratio)
+
+        # Let the JPEG decoder skip straight to a smaller scale
+        image.draft(None, (new_width, new_height))
+        resized = image.resize((new_width, new_height))
+
+        if preview:
+            preview.parent.mkdir(parents=True, exist_ok=True)
+            temp = preview.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            resized.convert("RGB").save(temp, format="JPEG", quality=90)
+            temp.replace(preview)
+
+        return resized
+
+    def preview_path(self, canvas_height: int, preview_dir: Path) -> Path:
+        path = Path(self.path).resolve()
+        key = f"{path}|{path.stat().st_mtime_ns}|{canvas_height}"
+        digest = hashlib.sha1(key.encode(), usedforsecurity=False).hexdigest()
+        return preview_dir / digest[:2] / f"{digest}.jpg"
+
+    def filter_delete(self, x: int, y: int) -> int | None:
+        """Delete the smallest box under the point and return its old index."""
         hit = self.find(x, y, "smallest")
-        self.boxes = [b for b in self.boxes if b != hit]
+        if hit is None:
+            return None
+        index = next(i for i, b in enumerate(self.boxes) if b is hit)
+        del self.boxes[index]
+        return index
 
-    def filter_size(self) -> None:
-        self.boxes = [b for b in self.boxes if not b.too_small()]
+    def filter_size(self) -> list[int]:
+        """Remove the boxes that are too small and return their old indexes."""
+        removed = [i for i, b in enumerate(self.boxes) if b.too_small()]
+        if removed:
+            self.boxes = [b for b in self.boxes if not b.too_small()]
+        return removed
 
     def find(self, x: int, y: int, size: BoxSize = "all") -> Box | None:
         hits = [b for b in self.boxes if b.point_hit(x, y)]
@@ -52,18 +104,22 @@ class Page:
 
         return None
 
+    def add_json_box(self, box: dict) -> Box:
+        """Add a box whose coordinates are relative to the full size image."""
+        box = Box(
+            x0=box["x0"],
+            y0=box["y0"],
+            x1=box["x1"],
+            y1=box["y1"],
+            start=box["start"],
+        )
+        box.fit_to_canvas(self.image_height, self.canvas_height)
+        self.boxes.append(box)
+        return box
+
     @classmethod
     def load_json(cls, page_data: dict, canvas_height: int) -> "Page":
         page = cls(path=page_data["path"], canvas_height=canvas_height)
-        page.resize(canvas_height)
         for box in page_data["boxes"]:
-            box = Box(
-                x0=box["x0"],
-                y0=box["y0"],
-                x1=box["x1"],
-                y1=box["y1"],
-                start=box["start"],
-            )
-            box.fit_to_canvas(page.image_height, canvas_height)
-            page.boxes.append(box)
+            page.add_json_box(box)
         return page
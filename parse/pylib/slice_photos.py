@@ -0,0 +1,74 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageTk
+
+from parse.pylib.slice_page import PREVIEW_DIR, Page
+
+Key = tuple[Path, int]
+
+
+class PhotoCache:
+    """
+    Canvas sized page images, decoded only when they are needed.
+
+    Scaled pages are also kept on disk in the preview directory, so reopening a
+    project reads small previews rather than the full size scans.
+
+    Displayed pages are kept in a small LRU. Neighboring pages are decoded and
+    resized in background threads so that paging through a directory does not
+    wait on the decoder. Tk objects must be made on the main thread, so the
+    background threads only produce PIL images.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 8,
+        workers: int = 2,
+        preview_dir: Path | None = PREVIEW_DIR,
+    ) -> None:
+        self.max_size = max_size
+        self.preview_dir = preview_dir
+        self.photos: OrderedDict[Key, ImageTk.PhotoImage] = OrderedDict()
+        self.pending: dict[Key, Future[Image.Image]] = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def photo(self, page: Page, canvas_height: int) -> ImageTk.PhotoImage:
+        key = (page.path, canvas_height)
+
+        if key in self.photos:
+            self.photos.move_to_end(key)
+            return self.photos[key]
+
+        future = self.pending.pop(key, None)
+        image = (
+            future.result() if future else page.resized(canvas_height, self.preview_dir)
+        )
+
+        photo = ImageTk.PhotoImage(image)
+        self.photos[key] = photo
+        while len(self.photos) > self.max_size:
+            self.photos.popitem(last=False)
+
+        return photo
+
+    def prefetch(self, pages: list[Page], canvas_height: int) -> None:
+        """Start decoding these pages and drop any other prefetches."""
+        keys = {(p.path, canvas_height): p for p in pages}
+
+        for key in list(self.pending):
+            if key not in keys:
+                self.pending.pop(key).cancel()
+
+        for key, page in keys.items():
+            if key not in self.photos and key not in self.pending:
+                self.pending[key] = self.executor.submit(
+                    page.resized, canvas_height, self.preview_dir
+                )
+
+    def clear(self) -> None:
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.photos = OrderedDict()
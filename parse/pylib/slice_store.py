@@ -0,0 +1,144 @@
+from pathlib import Path
+from typing import BinaryIO, Self
+
+import numpy as np
+
+from parse.pylib.slice_box import Box
+from parse.pylib.slice_page import Page
+
+COLUMNS = ("page", "x0", "y0", "x1", "y1", "start")
+
+
+class BoxStore:
+    """
+    Every box in a project held as NumPy columns.
+
+    Row order is page order and then reading order within a page, the same as
+    the project JSON. The page column is an index into paths. The coordinate
+    math mirrors Box, but works on all the boxes at once.
+
+    The store is saved as an .npz file that loads without parsing JSON. The JSON
+    format is still what slices_to_images.py reads.
+    """
+
+    def __init__(self, paths: list[str], cols: np.ndarray) -> None:
+        """Make a store from the paths and a (6, N) array ordered like COLUMNS."""
+        self.paths = paths
+        page, x0, y0, x1, y1, start = cols
+        self.page = page.astype(np.int32)
+        self.x0 = x0.astype(np.int64)
+        self.y0 = y0.astype(np.int64)
+        self.x1 = x1.astype(np.int64)
+        self.y1 = y1.astype(np.int64)
+        self.start = start.astype(np.bool_)
+
+    def __len__(self) -> int:
+        return len(self.page)
+
+    @classmethod
+    def from_dicts(cls, pages: list[dict]) -> Self:
+        """Build a store from project JSON data."""
+        rows = [
+            (i, b["x0"], b["y0"], b["x1"], b["y1"], b["start"])
+            for i, p in enumerate(pages)
+            for b in p["boxes"]
+        ]
+        cols = np.array(rows, dtype=np.int64).reshape(-1, len(COLUMNS)).T
+        return cls([p["path"] for p in pages], cols)
+
+    def to_dicts(self) -> list[dict]:
+        """Convert the store back into project JSON data."""
+        pages = [{"path": p, "boxes": []} for p in self.paths]
+        rows = zip(
+            self.page.tolist(),
+            self.x0.tolist(),
+            self.y0.tolist(),
+            self.x1.tolist(),
+            self.y1.tolist(),
+            self.start.tolist(),
+            strict=True,
+        )
+        for page, x0, y0, x1, y1, start in rows:
+            box = {"x0": x0, "y0": y0, "x1": x1, "y1": y1, "start": start}
+            pages[page]["boxes"].append(box)
+        return pages
+
+    @classmethod
+    def from_pages(cls, pages: list[Page]) -> Self:
+        """Build a store from the GUI pages in full size image coordinates."""
+        rows = [
+            (i, b.x0, b.y0, b.x1, b.y1, b.start)
+            for i, p in enumerate(pages)
+            for b in p.boxes
+        ]
+        cols = np.array(rows, dtype=np.float64).reshape(-1, len(COLUMNS)).T
+        store = cls([str(p.path) for p in pages], cols)
+        heights = np.array([p.image_height if p.boxes else 1 for p in pages])
+        canvas = np.array([p.canvas_height for p in pages])
+        # Boxes drawn in the GUI can have fractional canvas coordinates
+        store.x0, store.y0, store.x1, store.y1 = store.restore_coords(
+            heights, canvas, coords=cols[1:5]
+        )
+        return store
+
+    def to_pages(self, canvas_height: int) -> list[Page]:
+        """Build GUI pages with the boxes scaled to the canvas."""
+        pages = [Page(p, canvas_height) for p in self.paths]
+
+        heights = np.ones(len(pages), dtype=np.int64)
+        for i in np.unique(self.page).tolist():
+            heights[i] = pages[i].image_height
+        self.fit_to_canvas(heights, canvas_height)
+
+        rows = zip(
+            self.page.tolist(),
+            self.x0.tolist(),
+            self.y0.tolist(),
+            self.x1.tolist(),
+            self.y1.tolist(),
+            self.start.tolist(),
+            strict=True,
+        )
+        for page, x0, y0, x1, y1, start in rows:
+            pages[page].boxes.append(Box(x0=x0, y0=y0, x1=x1, y1=y1, start=start))
+
+        return pages
+
+    @classmethod
+    def load(cls, path: Path | BinaryIO) -> Self:
+        with np.load(path) as data:
+            paths = data["paths"].tolist()
+            return cls(paths, np.stack([data[c] for c in COLUMNS]))
+
+    def save(self, path: Path | BinaryIO) -> None:
+        np.savez(
+            path,
+            paths=np.array(self.paths, dtype=np.str_),
+            **{c: getattr(self, c) for c in COLUMNS},
+        )
+
+    def ratios(self, heights: np.ndarray, canvas: np.ndarray | int) -> np.ndarray:
+        """Per box image height over canvas height."""
+        canvas = np.broadcast_to(canvas, heights.shape)
+        return (heights / canvas)[self.page]
+
+    def restore_coords(
+        self,
+        heights: np.ndarray,
+        canvas: np.ndarray | int,
+        coords: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, ...]:
+        """Scale canvas coordinates up to the full size images."""
+        ratio = self.ratios(heights, canvas)
+        coords = (
+            np.stack((self.x0, self.y0, self.x1, self.y1)) if coords is None else coords
+        )
+        return tuple(np.trunc(ratio * c).astype(np.int64) for c in coords)
+
+    def fit_to_canvas(self, heights: np.ndarray, canvas: np.ndarray | int) -> None:
+        """Scale full size image coordinates down to the canvas, in place."""
+        ratio = 1.0 / self.ratios(heights, canvas)
+        self.x0 = np.trunc(ratio * self.x0).astype(np.int64)
+        self.y0 = np.trunc(ratio * self.y0).astype(np.int64)
+        self.x1 = np.trunc(ratio * self.x1).astype(np.int64)
+        self.y1 = np.trunc(ratio * self.y1).astype(np.int64)
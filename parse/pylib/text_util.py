@@ -1,3 +1,10 @@
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import batched
+
 import ftfy
 import regex as re
 
@@ -35,6 +42,135 @@ def to_positive_int(value: str | float) -> int | None:
         return None
 
 
+# ASCII text with none of these passes through ftfy.fix_text unchanged
+FTFY_ASCII = re.compile(r"[&\x00-\x09\x0b-\x1f\x7f]")
+
+CACHE_SIZE = 32
+
+Pass = tuple[str, str] | tuple[re.Pattern, dict[str, str]]
+
+
+def overlaps(x: str, y: str) -> bool:
+    """Check if one string contains the other or they overlap at their ends."""
+    if x in y or y in x:
+        return True
+    shortest = min(len(x), len(y))
+    return any(x.endswith(y[:n]) or y.endswith(x[:n]) for n in range(1, shortest))
+
+
+def replace_passes(replace: dict[str, str]) -> list[Pass]:
+    """
+    Group the replacements into as few single-pass regexes as possible.
+
+    A run of entries can share a pass when doing them all at once gives the same
+    result as doing them one after the other. That holds when no two keys
+    overlap, and no later key can match inside, or across the edge of, an earlier
+    replacement. Deleting text can join its neighbors into a new match for any
+    later key, so a deletion ends the run.
+    """
+    groups = []
+    for old, new in replace.items():
+        group = groups[-1] if groups else None
+        if (
+            old
+            and group
+            and all(
+                o and n and not overlaps(o, old) and not overlaps(old, n)
+                for o, n in group
+            )
+        ):
+            group.append((old, new))
+        else:
+            groups.append([(old, new)])
+
+    passes = []
+    for group in groups:
+        if len(group) == 1:
+            passes.append(group[0])
+        else:
+            keys = sorted((o for o, _ in group), key=len, reverse=True)
+            pattern = re.compile("|".join(re.escape(k) for k in keys))
+            passes.append((pattern, dict(group)))
+    return passes
+
+
+class Cleaner:
+    """
+    A text cleaner with its translation and replacement tables compiled.
+
+    The replacement table is turned into a few regex passes (usually one) that
+    give the same result as calling str.replace for every entry in order.
+    """
+
+    def __init__(
+        self,
+        trans: dict[int, str] | None = None,
+        replace: dict[str, str] | None = None,
+    ) -> None:
+        self.trans = trans
+        self.replace = replace
+        self.passes = replace_passes(replace) if replace else []
+
+    def replace_all(self, text: str) -> str:
+        for old, new in self.passes:
+            if isinstance(old, str):
+                text = text.replace(old, new)
+            else:
+                text = old.sub(lambda m, new=new: new[m.group()], text)
+        return text
+
+    def __call__(self, text: str, *, eol_hyphens: bool = False) -> str:
+        text = text if text else ""
+
+        # Handle uncommon mojibake
+        if self.trans:
+            text = text.translate(self.trans)
+
+        if self.passes:
+            text = self.replace_all(text)
+
+        text = compress(text)  # Space normalize
+
+        text = re.sub(r"\N{SHY}\s*", "", text)  # Remove soft-hyphens
+
+        # Join hyphenated words when they are at the end of a line
+        if eol_hyphens:
+            text = re.sub(r"([a-z])-\s+([a-z])", r"\1\2", text, flags=re.IGNORECASE)
+
+        # Handle common mojibake
+        if not text.isascii() or FTFY_ASCII.search(text):
+            text = ftfy.fix_text(text)
+
+        # Remove control characters
+        text = re.sub(r"\p{Cc}+", " ", text)
+
+        return text
+
+
+CLEANERS: dict[tuple[int, int], Cleaner] = {}
+
+
+def cleaner(
+    trans: dict[int, str] | None = None, replace: dict[str, str] | None = None
+) -> Cleaner:
+    """
+    Get the compiled cleaner for these tables.
+
+    Cleaners are cached by the identity of the tables, so a table should not be
+    changed after it is first used.
+    """
+    key = (id(trans), id(replace))
+    cached = CLEANERS.get(key)
+    if cached and cached.trans is trans and cached.replace is replace:
+        return cached
+
+    if len(CLEANERS) >= CACHE_SIZE:
+        del CLEANERS[next(iter(CLEANERS))]
+
+    CLEANERS[key] = Cleaner(trans, replace)
+    return CLEANERS[key]
+
+
 def clean_text(
     text: str,
     trans: dict[int, str] | None = None,
@@ -43,30 +179,52 @@ def clean_text(
     eol_hyphens: bool = False,
 ) -> str:
     """Clean text before trait extraction."""
-    text = text if text else ""
-
-    # Handle uncommon mojibake
-    if trans:
-        text = text.translate(trans)
-
-    if replace:
-        for old, new in replace.items():
-            text = text.replace(old, new)
-
-    text = compress(text)  # Space normalize
-
-    text = re.sub(r"\N{SHY}\s*", "", text)  # Remove soft-hyphens
-
-    # Join hyphenated words when they are at the end of a line
-    if eol_hyphens:
-        text = re.sub(r"([a-z])-\s+([a-z])", r"\1\2", text, flags=re.IGNORECASE)
+    return cleaner(trans, replace)(text, eol_hyphens=eol_hyphens)
 
-    text = ftfy.fix_text(text)  # Handle common mojibake
 
-    # Remove control characters
-    text = re.sub(r"\p{Cc}+", " ", text)
-
-    return text
+def clean_texts(  # noqa: PLR0913
+    texts: Iterable[str],
+    trans: dict[int, str] | None = None,
+    replace: dict[str, str] | None = None,
+    *,
+    eol_hyphens: bool = False,
+    workers: int | None = None,
+    chunk_size: int = 64,
+) -> Iterator[str]:
+    """
+    Clean a stream of documents across processes, yielding them in order.
+
+    The documents are sent to the workers in chunks and only a few chunks per
+    worker are in flight at a time, so memory stays bounded no matter how long
+    the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    clean = partial(clean_chunk, trans=trans, replace=replace, eol_hyphens=eol_hyphens)
+    chunks = batched(texts, chunk_size, strict=False)
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from clean(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(clean, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def clean_chunk(
+    texts: Iterable[str],
+    trans: dict[int, str] | None = None,
+    replace: dict[str, str] | None = None,
+    *,
+    eol_hyphens: bool = False,
+) -> list[str]:
+    return [clean_text(t, trans, replace, eol_hyphens=eol_hyphens) for t in texts]
 
 
 def remove_figures(text: str) -> str:
@@ -5,26 +5,37 @@ import shutil
 import textwrap
 from pathlib import Path
 
+from parse.pylib import log, metrics
+
 
 def main(args: argparse.Namespace) -> None:
+    log.started(args.metrics)
+
     for old_path in args.pdf_dir.glob("*.pdf"):
         print(f"Old name: {old_path}")
 
-        stem = old_path.stem
-        stem = re.sub(r"[^\w.]", "_", stem)
-        stem = re.sub(r"__+", "_", stem)
-        stem = re.sub(r"_+$", "", stem)
-
-        new_path = old_path.with_stem(stem)
+        new_path = clean_name(old_path)
 
         if new_path == old_path:
             print("Not changed.")
         else:
             print(f"New name: {new_path}")
             shutil.move(old_path, new_path)
+            metrics.count("renamed")
 
         print()
 
+    log.finished()
+
+
+def clean_name(old_path: Path) -> Path:
+    """Replace the characters in a PDF name that trouble command line tools."""
+    stem = old_path.stem
+    stem = re.sub(r"[^\w.]", "_", stem)
+    stem = re.sub(r"__+", "_", stem)
+    stem = re.sub(r"_+$", "", stem)
+    return old_path.with_stem(stem)
+
 
 def parse_args() -> argparse.Namespace:
     arg_parser = argparse.ArgumentParser(
@@ -47,6 +58,13 @@ def parse_args() -> argparse.Namespace:
         help="""The PDF directory containing PDFs with ugly file names.""",
     )
 
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
     args = arg_parser.parse_args()
     return args
 
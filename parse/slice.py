@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 import json
 import tkinter as tk
-from itertools import cycle
 from pathlib import Path
 from tkinter import Event, filedialog, messagebox, ttk
 from typing import ClassVar
 
+from parse.pylib.bulk_rename import natural_key
 from parse.pylib.slice_box import Box
+from parse.pylib.slice_journal import Journal
 from parse.pylib.slice_page import Page
+from parse.pylib.slice_photos import PhotoCache
+from parse.pylib.slice_store import BoxStore
 
 FONT = ("DejaVu Sans", 24)
 FONT_SM = ("liberation sans", 16)
@@ -15,6 +18,8 @@ FONT_SM_I = ("DejaVu Sans", 16, "italic")
 FONT_SM_U = ("DejaVu Sans", 16, "underline")
 FONT_SM_UI = ("DejaVu Sans", 16, "underline italic")
 
+PROJECT_TYPES = (("json", "*.json"), ("binary", "*.npz"), ("all files", "*"))
+
 
 class App(tk.Tk):
     row_span: ClassVar[int] = 10
@@ -38,7 +43,11 @@ class App(tk.Tk):
         self.image_dir: Path = Path()
         self.canvas: tk.Canvas = None
         self.pages = []
-        self.colors = cycle(self.color_list)
+        self.journal: Journal | None = None
+        self.photos = PhotoCache()
+        self.page_image: int | None = None
+        self.shown_tag: str | None = None
+        self.item_styles: dict[int, tuple[str, tuple[int, ...]]] = {}
         self.dirty = False
         self.dragging = False
 
@@ -100,34 +109,77 @@ class App(tk.Tk):
     def page(self) -> Page:
         return self.pages[self.page_no.get() - 1]
 
+    @property
+    def page_tag(self) -> str:
+        return f"page{self.page_no.get()}"
+
     def display_page(self) -> None:
         canvas_height = self.image_frame.winfo_height()
-        self.page.resize(canvas_height)
-        self.canvas.delete("all")
-        self.canvas.create_image((0, 0), image=self.page.photo, anchor="nw")
+        photo = self.photos.photo(self.page, canvas_height)
+
+        if self.page_image is None:
+            self.page_image = self.canvas.create_image((0, 0), image=photo, anchor="nw")
+        else:
+            self.canvas.itemconfigure(self.page_image, image=photo)
+
+        # Each page keeps its own box items, only the current page's are shown
+        if self.shown_tag:
+            self.canvas.itemconfigure(self.shown_tag, state="hidden")
+        self.shown_tag = self.page_tag
         self.display_page_boxes()
+        self.canvas.itemconfigure(self.shown_tag, state="normal")
+
         self.action.set("add")
+        self.prefetch_neighbors(canvas_height)
 
-    def display_page_boxes(self) -> None:
-        self.clear_page_boxes()
-        self.colors = cycle(self.color_list)
-        for box in self.page.boxes:
-            color = next(self.colors)
-            dash = (30, 20) if box.start else ()
-            self.canvas.create_rectangle(
-                box.x0,
-                box.y0,
-                box.x1,
-                box.y1,
-                outline=color,
-                width=4,
-                dash=dash,
-            )
+    def prefetch_neighbors(self, canvas_height: int) -> None:
+        """Decode the previous and next pages while the user looks at this one."""
+        index = self.page_no.get() - 1
+        neighbors = {(index + 1) % len(self.pages), (index - 1) % len(self.pages)}
+        neighbors.discard(index)
+        self.photos.prefetch([self.pages[i] for i in neighbors], canvas_height)
 
-    def clear_page_boxes(self) -> None:
-        for i, id_ in enumerate(self.canvas.find_all()):
-            if i:  # First object is the page itself
+    def display_page_boxes(self) -> None:
+        """Add, restyle, or remove only the canvas items for boxes that changed."""
+        tag = self.page_tag
+        keep = set()
+
+        for i, box in enumerate(self.page.boxes):
+            style = self.box_style(i, box)
+            outline, dash = style
+
+            if box.id not in self.item_styles:
+                box.id = self.canvas.create_rectangle(
+                    box.x0,
+                    box.y0,
+                    box.x1,
+                    box.y1,
+                    outline=outline,
+                    width=4,
+                    dash=dash,
+                    tags=(tag,),
+                )
+            elif self.item_styles[box.id] != style:
+                self.canvas.itemconfigure(box.id, outline=outline, dash=dash)
+
+            self.item_styles[box.id] = style
+            keep.add(box.id)
+
+        for id_ in self.canvas.find_withtag(tag):
+            if id_ not in keep:
                 self.canvas.delete(id_)
+                self.item_styles.pop(id_, None)
+
+    def box_style(self, index: int, box: Box) -> tuple[str, tuple[int, ...]]:
+        color = self.color_list[index % len(self.color_list)]
+        dash = (30, 20) if box.start else ()
+        return color, dash
+
+    def clear_canvas(self) -> None:
+        self.canvas.delete("all")
+        self.page_image = None
+        self.shown_tag = None
+        self.item_styles = {}
 
     def on_canvas_press(self, event: Event) -> None:
         x = self.canvas.canvasx(event.x)
@@ -135,13 +187,19 @@ class App(tk.Tk):
 
         if self.pages and self.action.get() == "add":
             self.dirty = True
-            color = next(self.colors)
-            id_ = self.canvas.create_rectangle(0, 0, 1, 1, outline=color, width=4)
-            self.page.boxes.append(Box(id=id_, x0=x, y0=y, x1=x, y1=y))
+            box = Box(x0=x, y0=y, x1=x, y1=y)
+            style = self.box_style(len(self.page.boxes), box)
+            box.id = self.canvas.create_rectangle(
+                0, 0, 1, 1, outline=style[0], width=4, tags=(self.page_tag,)
+            )
+            self.item_styles[box.id] = style
+            self.page.boxes.append(box)
             self.dragging = True
         elif self.pages and self.action.get() == "delete":
             self.dirty = True
-            self.page.filter_delete(x, y)
+            index = self.page.filter_delete(x, y)
+            if index is not None:
+                self.record("delete", index=index)
             self.display_page_boxes()
             self.action.set("add")
         elif self.pages and self.action.get() == "start":
@@ -149,6 +207,7 @@ class App(tk.Tk):
             box = self.page.find(x, y, "largest")
             if box:
                 box.start = not box.start
+                self.record("start", index=self.page.boxes.index(box), start=box.start)
                 self.display_page_boxes()
 
     def on_canvas_move(self, event: Event) -> None:
@@ -160,10 +219,35 @@ class App(tk.Tk):
 
     def on_canvas_release(self, _: Event) -> None:
         if self.dragging and self.pages and self.action.get() == "add":
-            self.page.filter_size()
+            box = self.page.boxes[-1]
+            new = len(self.page.boxes) - 1
+            # Boxes loaded at another window height can shrink below the size
+            # limit, log their removal so the journal's indexes stay in step
+            for index in reversed(self.page.filter_size()):
+                if index != new:
+                    self.record("delete", index=index)
+            if self.page.boxes and self.page.boxes[-1] is box:
+                coords = box.as_dict(self.page.image_height, self.page.canvas_height)
+                self.record("add", box=coords)
             self.display_page_boxes()
             self.dragging = False
 
+    def record(self, op: str, **kwargs: object) -> None:
+        """Append an edit to the journal and compact it when it gets long."""
+        if not self.journal:
+            return
+        self.journal.record(op, str(self.page.path), **kwargs)
+        if self.journal.due():
+            self.journal.compact(BoxStore.from_pages(self.pages))
+
+    def open_journal(self, journal: Journal | None) -> None:
+        """Switch to a new journal and replay any edits it holds."""
+        if self.journal:
+            self.journal.close()
+        self.journal = journal
+        if self.journal and self.journal.replay(self.pages):
+            self.dirty = True
+
     def save(self) -> None:
         if not self.pages:
             return
@@ -171,7 +255,7 @@ class App(tk.Tk):
         path = filedialog.asksaveasfilename(
             initialdir=self.curr_dir,
             title="Save image boxes",
-            filetypes=(("json", "*.json"), ("all files", "*")),
+            filetypes=PROJECT_TYPES,
         )
 
         if not path:
@@ -181,16 +265,24 @@ class App(tk.Tk):
         self.curr_dir = path.parent
         self.dirty = False
 
-        output = [p.as_dict() for p in self.pages]
+        output = BoxStore.from_pages(self.pages)
 
-        with path.open("w") as out_json:
-            json.dump(output, out_json, indent=4)
+        # The snapshot holds every edit so far, so the old journal is not needed
+        # once the snapshot is written
+        old = self.journal
+        if old and old.path == Journal.for_project(path).path:
+            old.compact(output, save=True)
+            return
+        if old:
+            old.close()
+        self.journal = Journal.for_project(path)
+        self.journal.compact(output, then=old.discard if old else None, save=True)
 
     def load(self) -> None:
         path = filedialog.askopenfilename(
             initialdir=self.curr_dir,
             title="Load image boxes",
-            filetypes=(("json", "*.json"), ("all files", "*")),
+            filetypes=PROJECT_TYPES,
         )
         if not path:
             return
@@ -202,16 +294,25 @@ class App(tk.Tk):
             self.setup_canvas()
         canvas_height = self.image_frame.winfo_height()
 
-        with path.open() as in_json:
-            json_pages = json.load(in_json)
-
         self.dirty = False
         self.pages = []
+        self.photos.clear()
+        self.clear_canvas()
+        journal = Journal.for_project(path)
+        # Unsaved edits from the last session may have been autosaved
+        base = journal.base()
         try:
-            for page_data in json_pages:
-                page = Page.load_json(page_data, canvas_height)
-                self.pages.append(page)
-
+            if path.suffix == ".npz":
+                self.pages = BoxStore.load(base).to_pages(canvas_height)
+            else:
+                with base.open() as in_json:
+                    json_pages = json.load(in_json)
+                for page_data in json_pages:
+                    page = Page.load_json(page_data, canvas_height)
+                    self.pages.append(page)
+
+            self.open_journal(journal)
+            self.dirty = self.dirty or base != path
             self.spinner_update(len(self.pages))
             self.save_button.configure(state="normal")
             self.display_page()
@@ -219,12 +320,13 @@ class App(tk.Tk):
         except KeyError:
             messagebox.showerror(
                 title="Load error",
-                message="Could not load the JSON file",
+                message="Could not load the project file",
             )
             self.pages = []
+            self.open_journal(None)
             self.save_button.configure(state="disabled")
             self.spinner_clear()
-            self.canvas.delete("all")
+            self.clear_canvas()
 
     def setup_canvas(self) -> None:
         self.update()
@@ -255,8 +357,9 @@ class App(tk.Tk):
 
         self.curr_dir = image_dir
         self.image_dir = Path(image_dir)
-        self.colors = cycle(self.color_list)
         self.dirty = False
+        self.photos.clear()
+        self.clear_canvas()
 
         paths = [
             p
@@ -265,17 +368,21 @@ class App(tk.Tk):
         ]
 
         if paths:
-            paths = sorted(p.name for p in paths)
+            # Natural order keeps "p_2" before "p_10", whether or not
+            # fix_page_nos.py has padded the page numbers
+            paths = sorted((p.name for p in paths), key=natural_key)
             self.spinner_update(len(paths))
             canvas_height = self.image_frame.winfo_height()
             self.pages = [Page(self.image_dir / p, canvas_height) for p in paths]
+            self.open_journal(Journal.for_image_dir(self.image_dir))
             self.save_button.configure(state="normal")
             self.display_page()
         else:
             self.pages = []
+            self.open_journal(None)
             self.save_button.configure(state="disabled")
             self.spinner_clear()
-            self.canvas.delete("all")
+            self.clear_canvas()
 
     def spinner_update(self, high: float) -> None:
         self.page_no.set(1)
@@ -297,6 +404,11 @@ class App(tk.Tk):
             )
             if not yes:
                 return
+            # The user chose to drop the edits, so don't replay them next time
+            if self.journal:
+                self.journal.discard()
+        if self.journal:
+            self.journal.close()
         self.destroy()
 
 
@@ -2,44 +2,162 @@
 
 import argparse
 import json
+import shutil
+import subprocess
 import textwrap
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 
+import rich
 from PIL import Image
 
-from parse.pylib.slice_box import Box
+from parse.pylib import log, metrics
+from parse.pylib.pdf_util import page_no, render_page
+from parse.pylib.slice_box import COORDS, Box
+
+Crop = tuple[COORDS, Path]
+PageTimes = tuple[float, list[tuple[str, float, int]]]
+JPEG = (".jpg", ".jpeg")
 
 
 def main(args: argparse.Namespace) -> None:
+    log.started(args.metrics)
+
     args.image_dir.mkdir(parents=True, exist_ok=True)
 
     with args.slices_json.open() as f:
         slices = json.load(f)
 
+    plan = plan_slices(slices, args.image_dir, args.description_pattern)
+
+    lossless = args.lossless and not args.in_pdf
+    if lossless and not shutil.which("jpegtran"):
+        rich.print("[bold red]jpegtran not found, cropping without --lossless")
+        lossless = False
+
+    crop = partial(crop_page, in_pdf=args.in_pdf, lossless=lossless)
+
+    pages = [p for p, _ in plan]
+    crops = [c for _, c in plan]
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            for page_path, times in zip(
+                pages, executor.map(crop, pages, crops), strict=True
+            ):
+                record_times(page_path, times, from_pdf=bool(args.in_pdf))
+    else:
+        for page_path, times in zip(pages, map(crop, pages, crops), strict=True):
+            record_times(page_path, times, from_pdf=bool(args.in_pdf))
+
+    log.finished()
+
+
+def plan_slices(
+    slices: list[dict], image_dir: Path, description_pattern: str | None = None
+) -> list[tuple[Path, list[Crop]]]:
+    """
+    Work out where every slice goes before any cropping is done.
+
+    The description subdirectories are numbered by counting the start boxes in
+    reading order, so this must be done serially. The pages can then be cropped
+    in any order.
+    """
+    plan = []
     subdir = 0
 
     for page in slices:
-        image = Image.open(page["path"])
+        page_path = Path(page["path"])
+        crops = []
 
         for b, box in enumerate(page["boxes"], 1):
             box = Box(**box)
 
-            box_slice = image.crop((box.x0, box.y0, box.x1, box.y1))
-            page_path = Path(page["path"])
-
             if box.start:
                 subdir += 1
 
-            slice_path = args.image_dir
+            slice_path = image_dir
 
-            if args.description_pattern:
-                slice_path /= f"{args.description_pattern}_{subdir:03}"
+            if description_pattern:
+                slice_path /= f"{description_pattern}_{subdir:03}"
                 if box.start:
                     slice_path.mkdir(parents=True, exist_ok=True)
 
             slice_path /= f"{page_path.stem}_{b:02d}{page_path.suffix}"
 
+            crops.append(((box.x0, box.y0, box.x1, box.y1), slice_path))
+
+        if crops:
+            plan.append((page_path, crops))
+
+    return plan
+
+
+def crop_page(
+    page_path: Path,
+    crops: list[Crop],
+    in_pdf: Path | None = None,
+    *,
+    lossless: bool = False,
+) -> PageTimes:
+    """Crop all of the slices from a page and return how long each step took."""
+    lossless = lossless and page_path.suffix.lower() in JPEG
+
+    started = time.perf_counter()
+    image = None
+    if not lossless:
+        image = open_page(page_path, in_pdf)
+        image.load()
+    load_time = time.perf_counter() - started
+
+    times = []
+    for coords, slice_path in crops:
+        started = time.perf_counter()
+        if image is None:
+            lossless_crop(page_path, slice_path, coords)
+        else:
+            box_slice = image.crop(coords)
             box_slice.save(slice_path)
+        elapsed = time.perf_counter() - started
+        times.append((slice_path.name, elapsed, slice_path.stat().st_size))
+
+    return load_time, times
+
+
+def record_times(page_path: Path, times: PageTimes, *, from_pdf: bool) -> None:
+    """Crops may run in other processes, so their times are recorded here."""
+    load_time, slice_times = times
+    metrics.observe("load_page", load_time, page=page_path.name)
+    if not from_pdf:
+        metrics.count("page_bytes", page_path.stat().st_size)
+    for name, seconds, size in slice_times:
+        metrics.observe("crop_slice", seconds, slice=name)
+        metrics.count("slices")
+        metrics.count("slice_bytes", size)
+
+
+def lossless_crop(page_path: Path, slice_path: Path, coords: COORDS) -> None:
+    """
+    Crop a JPEG without decoding and re-encoding it.
+
+    jpegtran can only cut on MCU boundaries (usually 8 or 16 pixels), so the top
+    left corner of the slice may move up and left by a few pixels.
+    """
+    x0, y0, x1, y1 = coords
+    x0, x1 = sorted((x0, x1))
+    y0, y1 = sorted((y0, y1))
+    crop = f"{x1 - x0}x{y1 - y0}+{x0}+{y0}"
+    cmd = ["jpegtran", "-crop", crop, "-copy", "none", "-outfile", slice_path]
+    subprocess.run([*cmd, page_path], capture_output=True, check=True)  # noqa: S603
+
+
+def open_page(page_path: Path, in_pdf: Path | None = None) -> Image.Image:
+    """Open the page image, or render the page straight from its PDF."""
+    if in_pdf:
+        return render_page(in_pdf, page_no(page_path))
+    return Image.open(page_path)
 
 
 def parse_args() -> argparse.Namespace:
@@ -85,6 +203,41 @@ def parse_args() -> argparse.Namespace:
             using this pattern as the basis of subdirectory name.""",
     )
 
+    arg_parser.add_argument(
+        "--in-pdf",
+        type=Path,
+        metavar="PDF",
+        help="""Render the pages from this PDF in memory instead of reading the
+            page images made by pdf_to_images.py. The page number is taken from
+            the end of each image name in the slices JSON. This skips a lossy
+            encode/decode step, and the page images do not need to exist.""",
+    )
+
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        metavar="INT",
+        help="""Crop this many pages at once in separate processes.
+            (default: %(default)s)""",
+    )
+
+    arg_parser.add_argument(
+        "--lossless",
+        action="store_true",
+        help="""Crop JPEG pages with jpegtran instead of decoding and re-encoding
+            them. This is faster and adds no compression artifacts, but the slice
+            edges snap outward to the JPEG's 8 or 16 pixel blocks. Other image
+            formats and --in-pdf are cropped as usual.""",
+    )
+
+    arg_parser.add_argument(
+        "--metrics",
+        type=Path,
+        metavar="PATH",
+        help="""Append timing metrics to this JSON lines file.""",
+    )
+
     args = arg_parser.parse_args()
     return args
 
@@ -0,0 +1,71 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from parse.pylib import bulk_rename
+
+
+class TestPlanRenames(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp.name)
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+
+    def plan(self, *names: str, width: int = 4) -> dict[str, str]:
+        paths = [self.dir / n for n in names]
+        for path in paths:
+            path.touch()
+        plan = bulk_rename.plan_renames(paths, width)
+        return {src.name: dst.name for src, dst in plan}
+
+    def test_plan_renames_01(self) -> None:
+        """It pads a single page."""
+        self.assertEqual(self.plan("page_7.jpg"), {"page_7.jpg": "page_0007.jpg"})
+
+    def test_plan_renames_02(self) -> None:
+        """It only pads the page number, not the document number."""
+        self.assertEqual(
+            self.plan("vol2-1.jpg", "vol2-2.jpg", "vol3-1.jpg", "vol3-2.jpg"),
+            {
+                "vol2-1.jpg": "vol2-0001.jpg",
+                "vol2-2.jpg": "vol2-0002.jpg",
+                "vol3-1.jpg": "vol3-0001.jpg",
+                "vol3-2.jpg": "vol3-0002.jpg",
+            },
+        )
+
+    def test_plan_renames_03(self) -> None:
+        """It pads the page number when each document has one page."""
+        self.assertEqual(
+            self.plan("vol2-1.jpg", "vol3-1.jpg"),
+            {"vol2-1.jpg": "vol2-0001.jpg", "vol3-1.jpg": "vol3-0001.jpg"},
+        )
+
+    def test_plan_renames_04(self) -> None:
+        """It pads to the widest page number of a document."""
+        self.assertEqual(
+            self.plan("doc-1.jpg", "doc-12345.jpg"), {"doc-1.jpg": "doc-00001.jpg"}
+        )
+
+    def test_plan_renames_05(self) -> None:
+        """It keeps the text after the page number."""
+        self.assertEqual(
+            self.plan("p1_scan.jpg", "p10_scan.jpg", width=2),
+            {"p1_scan.jpg": "p01_scan.jpg"},
+        )
+
+    def test_plan_renames_06(self) -> None:
+        """It leaves names without numbers and padded names alone."""
+        self.assertEqual(self.plan("cover.jpg", "page_0002.jpg"), {})
+
+    def test_plan_renames_07(self) -> None:
+        """It refuses to overwrite a file."""
+        with self.assertRaises(bulk_rename.CollisionError):  # noqa: PT027
+            self.plan("page_7.jpg", "page_0007.jpg")
+
+    def test_plan_renames_08(self) -> None:
+        """It refuses to give two files the same name."""
+        with self.assertRaises(bulk_rename.CollisionError):  # noqa: PT027
+            self.plan("page_7.jpg", "page_07.jpg")
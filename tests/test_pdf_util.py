@@ -0,0 +1,47 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from parse.pylib import pdf_util
+
+
+@unittest.skipUnless(shutil.which("pdftocairo"), "poppler is not installed")
+class TestRenderPage(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp = tempfile.TemporaryDirectory()
+        self.pdf = Path(self.temp.name) / "doc.pdf"
+        pages = [
+            Image.new("RGB", (200, 100), "white"),
+            Image.new("RGB", (300, 150), "black"),
+        ]
+        # At 72 DPI one pixel is one point, so the pages are 200x100 and 300x150 pt
+        pages[0].save(self.pdf, save_all=True, append_images=pages[1:], resolution=72)
+
+    def tearDown(self) -> None:
+        self.temp.cleanup()
+
+    def test_render_page_01(self) -> None:
+        """It renders the requested page at the requested resolution."""
+        image = pdf_util.render_page(self.pdf, 2, dpi=144)
+        self.assertEqual(image.size, (600, 300))
+
+    def test_render_page_02(self) -> None:
+        """It renders the first page to an RGB image."""
+        image = pdf_util.render_page(self.pdf, 1, dpi=72)
+        self.assertEqual(image.size, (200, 100))
+        self.assertEqual(image.mode, "RGB")
+        self.assertEqual(image.getpixel((100, 50)), (255, 255, 255))
+
+
+class TestPageNo(unittest.TestCase):
+    def test_page_no_01(self) -> None:
+        """It gets the page number from the end of the image name."""
+        self.assertEqual(pdf_util.page_no(Path("vol2-0012.jpg")), 12)
+
+    def test_page_no_02(self) -> None:
+        """It rejects names without a page number."""
+        with self.assertRaises(ValueError):  # noqa: PT027
+            pdf_util.page_no(Path("cover.jpg"))